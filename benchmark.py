@@ -0,0 +1,209 @@
+# Benchmarks odds parsing, competitor matching, event alignment, surebet detection and stake calculations on synthetic
+# broker odds, to see where the program stops scaling as more sites and markets are added. Results are saved as JSON,
+# e.g. `python benchmark.py --events 10 100 1000 --brokers 3 7 15 --markets 1 3 --output benchmark.json`
+import argparse
+import contextlib
+import io
+import json
+import random
+import time
+from fractions import Fraction
+
+import numpy as np
+
+from lib import arbitrage, detection, events, calculations, matching, odds
+
+# Markets to benchmark, in the order they're added as the market count goes up
+BENCHMARK_MARKETS = ['win', 'btts', 'over-under-2.5', '1x2', 'over-under-1.5', 'halftime-1x2', 'over-under-3.5']
+THREE_WAY_MARKETS = ['win', '1x2', 'halftime-1x2']
+
+# Pieces used to make up team names
+SYLLABLES = ['ar', 'bel', 'cor', 'dal', 'en', 'fal', 'gor', 'hal', 'is', 'jor', 'kel', 'lin', 'mar', 'nor', 'os',
+             'pal', 'quin', 'ros', 'sen', 'tor', 'ul', 'val', 'wen', 'xer', 'yor', 'zan', 'bri', 'cas', 'dun', 'el']
+PREFIXES = ['', '', '', 'Real ', 'Sporting ', 'Dynamo ', 'Atletico ', 'Inter ', 'Racing ', 'Olympique ']
+SUFFIXES = ['', '', '', ' United', ' City', ' Town', ' Rovers', ' Athletic', ' Wanderers', ' Saint']
+
+# Share of each broker's events that are listed the other way round, and that are suspended
+REVERSED_SHARE = 0.05
+MISSING_SHARE = 0.02
+
+
+# Makes a list of unique team names
+def team_names(count, rng):
+    names = set()
+    while len(names) < count:
+        place = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+        names.add(rng.choice(PREFIXES) + place + rng.choice(SUFFIXES))
+    return sorted(names)
+
+
+# Writes a team name the way a particular broker might, with club tokens, abbreviations, accents, case and typos
+def noisy_name(name, rng):
+    if rng.random() < 0.2:
+        name = name + ' FC' if rng.random() < 0.5 else 'FC ' + name
+    if rng.random() < 0.3:
+        name = name.replace('United', 'Utd').replace('Saint', 'St')
+    if rng.random() < 0.1:
+        name = name.replace('e', 'é', 1)
+    if rng.random() < 0.1:
+        name = name.upper() if rng.random() < 0.5 else name.lower()
+    if rng.random() < 0.05 and len(name) > 6:
+        typo = rng.randrange(1, len(name) - 1)
+        name = name[:typo] + name[typo + 1:]
+    return name
+
+
+# Formats decimal odds as a broker would show them, as they are, with a comma, or as fractional odds
+def format_odds(value, odds_format):
+    if odds_format == 'fractional':
+        fraction = Fraction(value - 1).limit_denominator(20)
+        if fraction == 1:
+            return 'EVS'
+        return f'{max(fraction.numerator, 1)}/{fraction.denominator}'
+    if odds_format == 'comma':
+        return f'{value:.2f}'.replace('.', ',')
+    return f'{value:.2f}'
+
+
+# Creates the odds dictionary each broker's scraper would build, with the competitors and a list of odds strings for
+# every row of each market. Every broker lists most events, odds have a margin and some noise so a few surebets turn up,
+# and the brokers take turns using decimal, fractional and comma-decimal odds
+def synthetic_odds(event_count, broker_count, markets, seed=0):
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    teams = team_names(event_count * 2, rng)
+    rng.shuffle(teams)
+    fixtures = list(zip(teams[::2], teams[1::2]))
+
+    # Fair probabilities for every event's outcomes in each market
+    probabilities = {market: np_rng.dirichlet(np.full(3 if market in THREE_WAY_MARKETS else 2, 4), size=event_count)
+                     for market in markets}
+
+    odds_dicts = {}
+    for broker_number in range(broker_count):
+        odds_format = ['decimal', 'fractional', 'comma'][broker_number % 3]
+        listed = np.flatnonzero(np_rng.random(event_count) < 0.9)
+        odds_dict = {market: {'Competitors': [], 'Odds': []} for market in markets}
+
+        for event in listed:
+            home, away = fixtures[event]
+            reversed_event = rng.random() < REVERSED_SHARE
+            names = [noisy_name(home, rng), noisy_name(away, rng)]
+            competitors = ' - '.join(names[::-1] if reversed_event else names)
+
+            for market in markets:
+                fair = probabilities[market][event]
+                market_odds = np.maximum(1 / (fair * 1.06 * np_rng.lognormal(0, 0.03, len(fair))), 1.01)
+
+                # Home/away markets are listed in the same order as the teams
+                if reversed_event and market in arbitrage.SIDED_MARKETS:
+                    market_odds = market_odds[::-1]
+
+                odds_dict[market]['Competitors'].append(competitors)
+                if rng.random() < MISSING_SHARE:
+                    odds_dict[market]['Odds'].append(['SUSP'] * len(fair))
+                else:
+                    odds_dict[market]['Odds'].append([format_odds(value, odds_format) for value in market_odds])
+
+        odds_dicts[f'Broker {broker_number + 1}'] = odds_dict
+
+    return odds_dicts
+
+
+# Times a function, keeping the fastest of a number of runs. Anything it prints is hidden
+def time_stage(function, repeat):
+    best = None
+    result = None
+
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = function()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return result, best
+
+
+# Runs every stage of the detection pipeline on one set of synthetic dataframes
+def run_case(event_count, broker_count, market_count, matcher, repeat, seed):
+    markets = BENCHMARK_MARKETS[:market_count]
+    odds_dicts = synthetic_odds(event_count, broker_count, markets, seed)
+    timings = {}
+
+    # Parse every broker's odds into typed dataframes, like the site workers do
+    odds_dfs, timings['parsing'] = time_stage(
+        lambda: {broker: odds.create_df(odds_dicts[broker]) for broker in odds_dicts}, repeat)
+
+    # Match every broker's competitors to events
+    index, timings['matching'] = time_stage(lambda: events.build_index(odds_dfs, matcher=matcher), repeat)
+
+    # Line every broker's rows up with the events once, for all markets
+    alignments, timings['alignment'] = time_stage(lambda: detection.align_brokers(odds_dfs, index), repeat)
+
+    # Find the surebets in every market, as detection.get_all_surebets does, on the detection pool if it's running
+    all_surebets, timings['detection'] = time_stage(
+        lambda: detection.detect_markets(odds_dfs, alignments, index['names'], markets, THREE_WAY_MARKETS), repeat)
+    all_surebets = {market: all_surebets[market] for market in all_surebets if all_surebets[market]}
+
+    # Work out the stakes for every surebet
+    bets, timings['calculations'] = time_stage(
+        lambda: calculations.do_surebet_calculations(all_surebets, THREE_WAY_MARKETS, 100, 5), repeat)
+
+    return {
+        'events': event_count,
+        'brokers': broker_count,
+        'markets': market_count,
+        'matcher': matcher,
+        'detection_pool': detection.pool is not None,
+        'rows': int(sum(len(df) for df in odds_dfs.values())),
+        'events_indexed': len(index['names']),
+        'surebets': int(sum(len(all_surebets[market][combo]) for market in all_surebets
+                            for combo in all_surebets[market])),
+        'seconds': timings,
+        'total_seconds': sum(timings.values())
+    }
+
+
+# Main function
+def main(event_counts, broker_counts, market_counts, matcher, repeat, seed, output=None):
+    results = []
+
+    for event_count in event_counts:
+        for broker_count in broker_counts:
+            for market_count in market_counts:
+                result = run_case(event_count, broker_count, market_count, matcher, repeat, seed)
+                results.append(result)
+
+                stages = ', '.join(f'{stage} {seconds * 1000:.1f}ms' for stage, seconds in result['seconds'].items())
+                print(f'{event_count} events, {broker_count} brokers, {market_count} markets: {stages}')
+
+    if output is not None:
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark surebet detection on synthetic broker data.')
+    parser.add_argument('--events', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help='events per broker')
+    parser.add_argument('--brokers', type=int, nargs='+', default=[3, 7, 15], help='number of brokers')
+    parser.add_argument('--markets', type=int, nargs='+', default=[1, 3], help='number of markets')
+    parser.add_argument('--matcher', choices=list(matching.matchers), default=matching.DEFAULT_MATCHER,
+                        help='competitor matcher to use')
+    parser.add_argument('--repeat', type=int, default=1, help='runs of each stage, keeping the fastest')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the synthetic data')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='processes to detect surebets with, 0 for one for each CPU')
+    parser.add_argument('--output', help='file to save the results to as JSON, instead of printing them')
+    args = parser.parse_args()
+
+    detection.start_pool(args.processes)
+    try:
+        main(args.events, args.brokers, args.markets, args.matcher, args.repeat, args.seed, args.output)
+    finally:
+        detection.stop_pool()
@@ -0,0 +1,44 @@
+import sqlite3
+import time
+
+# Where aliases are stored between runs
+ALIAS_STORE_PATH = 'files/aliases.sqlite3'
+
+# How long, in seconds, an alias is kept after it was last seen
+ALIAS_TTL = 24 * 60 * 60
+
+
+# Opens the alias store, creating it if needed and removing expired aliases
+def open_store(path=ALIAS_STORE_PATH, ttl=ALIAS_TTL):
+    store = sqlite3.connect(path)
+    store.execute('CREATE TABLE IF NOT EXISTS aliases ('
+                  'broker TEXT NOT NULL, '
+                  'competitors TEXT NOT NULL, '
+                  'event TEXT NOT NULL, '
+                  'reversed INTEGER NOT NULL, '
+                  'last_seen REAL NOT NULL, '
+                  'PRIMARY KEY (broker, competitors))')
+    evict_expired(store, ttl)
+    return store
+
+
+# Removes aliases that haven't been seen within the TTL
+def evict_expired(store, ttl=ALIAS_TTL):
+    with store:
+        store.execute('DELETE FROM aliases WHERE last_seen < ?', (time.time() - ttl,))
+
+
+# Gets all known aliases for a broker as a dictionary of raw competitor names to (event, reversed)
+def load_aliases(store, broker):
+    rows = store.execute('SELECT competitors, event, reversed FROM aliases WHERE broker = ?', (broker,))
+    return {competitors: (event, bool(is_reversed)) for competitors, event, is_reversed in rows}
+
+
+# Saves a broker's aliases. Existing aliases keep their event and just have their last seen time refreshed
+def save_aliases(store, broker, aliases):
+    now = time.time()
+    with store:
+        store.executemany('INSERT INTO aliases VALUES (?, ?, ?, ?, ?) '
+                          'ON CONFLICT (broker, competitors) DO UPDATE SET last_seen = excluded.last_seen',
+                          [(broker, competitors, event, int(is_reversed), now)
+                           for competitors, (event, is_reversed) in aliases.items()])
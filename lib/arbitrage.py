@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+# Markets where the outcomes are in home/away order, so need flipping when a broker lists the teams the other way round
+SIDED_MARKETS = ['win', '1x2', 'halftime-1x2']
+
+
+# Build an [event x broker x outcome] tensor of odds from each broker's odds array and the event ID and reversed flag
+# of each row, with NaN where a broker doesn't have an event. Rows are placed by their event ID, so no merging on
+# competitor names is needed
+def build_tensor(broker_odds, alignments, event_count, market, outcomes):
+    tensor = np.full((event_count, len(broker_odds), outcomes), np.nan)
+
+    for i, (market_odds, (ids, reversed_rows)) in enumerate(zip(broker_odds, alignments)):
+        # Put outcomes in the same order as the event's teams
+        if market in SIDED_MARKETS:
+            market_odds = market_odds.copy()
+            market_odds[reversed_rows] = market_odds[reversed_rows, ::-1]
+
+        tensor[ids, i] = market_odds
+
+    return tensor
+
+
+# Formula to find surebets in an odds tensor, using the best odds for each outcome across all brokers
+def find_surebets(tensor):
+    # Missing odds should never be the best ones
+    filled = np.where(np.isnan(tensor), -np.inf, tensor)
+    best_brokers = filled.argmax(axis=1)
+    best_odds = filled.max(axis=1)
+
+    # Every outcome needs odds, and the best odds must come from more than one broker
+    complete = np.isfinite(best_odds).all(axis=1)
+    multiple_brokers = (best_brokers != best_brokers[:, :1]).any(axis=1)
+
+    # Add reciprocals of the best odds, anything under 1 is a surebet
+    with np.errstate(divide='ignore'):
+        implied = np.where(complete, (1 / np.where(complete[:, None], best_odds, 1)).sum(axis=1), np.inf)
+
+    surebets = complete & multiple_brokers & (implied < 1)
+    return best_odds, best_brokers, implied, surebets
+
+
+# Create a dataframe of surebets for each combination of brokers used. Brokers are named in outcome order to make bets
+# easier to find
+def get_surebet_dfs(event_names, brokers, best_odds, best_brokers, implied, surebets):
+    surebet_events = np.flatnonzero(surebets)
+    if not len(surebet_events):
+        return {}
+
+    outcomes = best_odds.shape[1]
+    names = np.array(event_names, dtype=object)[surebet_events]
+    combos, combo_rows = np.unique(best_brokers[surebet_events], axis=0, return_inverse=True)
+    combo_rows = combo_rows.reshape(-1)
+
+    # Build each combination's dataframe straight from its rows
+    surebets_dict = {}
+    for i, combo in enumerate(combos):
+        rows = surebet_events[combo_rows == i]
+        surebet_df = {'Competitors': names[combo_rows == i]}
+        surebet_df.update({f'Odds {outcome + 1}': best_odds[rows, outcome] for outcome in range(outcomes)})
+        surebet_df['Surebet'] = implied[rows]
+        surebets_dict['-'.join([brokers[broker] for broker in combo])] = pd.DataFrame(surebet_df)
+
+    return surebets_dict
+
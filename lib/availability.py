@@ -0,0 +1,66 @@
+# Remembers which markets each sport has on a site, so markets the site doesn't offer aren't tried on every cycle. The
+# markets are read from the site's market dropdown in one go, and read again once the site's market_cache_ttl has
+# passed, or straight away if a market that should have been there wasn't. Each site worker has its own cache
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+from . import tracing, utils
+
+# Markets read for each site and sport, stored as {(site, sport): {'time': ..., 'markets': [...]}}
+cache = {}
+
+
+# Gets the markets a sport is known to have on a site, or None if they need reading again
+def known_markets(site, sport):
+    entry = cache.get((site, sport))
+    if entry is None or time.time() - entry['time'] >= utils.get_site_setting(site, 'market_cache_ttl'):
+        return None
+    return entry['markets']
+
+
+# Forgets a sport's markets on a site, so they're read again next time, e.g. after a market couldn't be found
+def forget(site, sport):
+    cache.pop((site, sport), None)
+
+
+# Checks whether a market is one of the markets read from a site. Sites list markets with extra detail, e.g. "Over/Under
+# 2.5 Goals", so the market only needs to be part of one
+def is_available(market, available):
+    return any(market in option for option in available)
+
+
+# Splits markets into those in a list of the site's markets and those that aren't
+def split_markets(markets, available, option_for=None):
+    found = [market for market in markets
+             if is_available(market if option_for is None else option_for(market), available)]
+    missing = [market for market in markets if market not in found]
+    return found, missing
+
+
+# Splits markets into those a site has for a sport and those it doesn't, reading the site's markets with read_markets if
+# they aren't known. option_for gives the text a market has in the site's dropdown. If the markets can't be read, or
+# none of them are in what was read, every market is tried and nothing is cached
+def filter_markets(driver, site, sport, markets, read_markets, option_for=None):
+    if utils.get_site_setting(site, 'market_cache_ttl') <= 0 or not markets:
+        return markets, []
+
+    available = known_markets(site, sport)
+    if available is None:
+        try:
+            with tracing.span('read_markets') as attributes:
+                available = [option.strip() for option in read_markets(driver) if option.strip()]
+                attributes['markets'] = len(available)
+        except WebDriverException:
+            available = []
+
+        found, missing = split_markets(markets, available, option_for)
+
+        # A dropdown read before it had finished loading can look like a list without any of the markets, which
+        # shouldn't stop them all being tried until the cache expires
+        if not found:
+            return markets, []
+        cache[(site, sport)] = {'time': time.time(), 'markets': available}
+        return found, missing
+
+    return split_markets(markets, available, option_for)
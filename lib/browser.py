@@ -0,0 +1,261 @@
+# Starts the headless Chrome every site scrapes with. The lean profile, set in the "browser" section of the settings and
+# overridden for a site with a "browser" section in its own settings, stops Chrome downloading images, fonts, media,
+# ads and trackers, returns from page loads once the page can be read, turns off features the scrapers don't use and
+# caps how much memory each tab's JavaScript can use. Each site's Chrome keeps its profile in its own directory between
+# launches, so cookie consent and odds formats only need setting up once
+import json
+import os
+import platform
+import time
+
+from selenium import webdriver
+from selenium.common.exceptions import SessionNotCreatedException, WebDriverException
+from selenium.webdriver.chrome.options import Options
+
+from . import utils
+
+psutil_installed = True
+
+try:
+    import psutil
+except ImportError:
+    psutil_installed = False
+
+# URL patterns for each type of resource that can be blocked
+RESOURCE_PATTERNS = {
+    'image': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico', '*.bmp', '*.avif'],
+    'font': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+    'media': ['*.mp4', '*.webm', '*.mp3', '*.m3u8', '*.ogg', '*.wav'],
+    'stylesheet': ['*.css']
+}
+
+# How many profile directories a site can have, for when an old Chrome is still using one
+PROFILE_SLOTS = 5
+
+# File in a profile directory recording which setup steps have been done with it
+SETUP_FILE = 'surebet-setup.json'
+
+# Chrome features the scrapers never use
+LEAN_ARGUMENTS = [
+    '--disable-extensions',
+    '--disable-gpu',
+    '--disable-dev-shm-usage',
+    '--disable-sync',
+    '--disable-default-apps',
+    '--disable-component-update',
+    '--disable-background-networking',
+    '--disable-notifications',
+    '--disable-features=Translate,OptimizationHints,MediaRouter,AutofillServerCommunication',
+    '--no-first-run',
+    '--no-default-browser-check',
+    '--mute-audio'
+]
+
+
+# Gets a site's browser profile, which is the browser settings with the site's own browser settings on top. Sites read
+# from their feeds also get the network log
+def get_profile(site=None):
+    settings = utils.load_settings()
+    profile = dict(settings.get('browser', {}))
+    if site is not None:
+        profile.update(settings['sites'].get(site, {}).get('browser', {}))
+        profile['network_log'] = utils.get_site_setting(site, 'acquisition') == 'feed'
+    return profile
+
+
+# Gets the path to Chromedriver for this platform
+def chromedriver_path():
+    if platform.system() == 'Windows':
+        return 'chromedriver/chromedriver.exe'
+
+    if platform.system() == 'Darwin':
+        path = 'chromedriver/chromedriver_mac'
+    else:
+        path = 'chromedriver/chromedriver_linux'
+    os.chmod(path, 0o755)
+    return path
+
+
+# Checks whether a Chrome is still using a profile directory. Chrome locks the directory with a link to its host and
+# process ID on Mac and Linux, and with a file it keeps open on Windows
+def directory_in_use(path):
+    if platform.system() == 'Windows':
+        try:
+            os.remove(os.path.join(path, 'lockfile'))
+        except FileNotFoundError:
+            return False
+        except OSError:
+            return True
+        return False
+
+    try:
+        host, pid = os.readlink(os.path.join(path, 'SingletonLock')).rsplit('-', 1)
+    except (OSError, ValueError):
+        return False
+
+    if host != platform.node():
+        return False
+
+    try:
+        os.kill(int(pid), 0)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+# Gets a profile directory for a site that no other Chrome is using, or None to use a new temporary profile
+def user_data_path(site, directory):
+    if directory is None:
+        return None
+
+    for slot in range(1, PROFILE_SLOTS + 1):
+        path = os.path.abspath(os.path.join(directory, site if slot == 1 else f'{site}-{slot}'))
+        if not directory_in_use(path):
+            os.makedirs(path, exist_ok=True)
+            return path
+
+    return None
+
+
+# Checks whether a setup step, like accepting cookies, has been done with the driver's profile before
+def setup_done(driver, step):
+    path = getattr(driver, 'user_data_path', None)
+    if path is None:
+        return False
+
+    try:
+        with open(os.path.join(path, SETUP_FILE)) as setup_file:
+            return json.load(setup_file).get(step, False)
+    except (OSError, ValueError):
+        return False
+
+
+# Records that a setup step has been done with the driver's profile, so it can be skipped next time
+def mark_setup_done(driver, step):
+    path = getattr(driver, 'user_data_path', None)
+    if path is None:
+        return
+
+    steps = {}
+    try:
+        with open(os.path.join(path, SETUP_FILE)) as setup_file:
+            steps = json.load(setup_file)
+    except (OSError, ValueError):
+        pass
+
+    steps[step] = True
+    with open(os.path.join(path, SETUP_FILE), 'w') as setup_file:
+        json.dump(steps, setup_file)
+
+
+# Gets the URL patterns a profile blocks in every tab
+def blocked_urls(profile):
+    return [pattern for resource in profile.get('blocked_resources', []) for pattern in RESOURCE_PATTERNS[resource]]
+
+
+# Creates the Chrome options for a profile. A profile that isn't lean gets the options every site used before the lean
+# profile, so the two can be compared
+def create_options(profile):
+    options = Options()
+    options.headless = profile.get('headless', True)
+    options.add_argument('window-size=1920,1080')
+    options.add_experimental_option('excludeSwitches', ['enable-logging'])
+
+    # Markets are scraped in background tabs, so stop Chrome slowing them down
+    options.add_argument('--disable-background-timer-throttling')
+    options.add_argument('--disable-backgrounding-occluded-windows')
+    options.add_argument('--disable-renderer-backgrounding')
+
+    # Keep the site's cookies and settings between launches
+    if profile.get('user_data_path'):
+        options.add_argument(f'--user-data-dir={profile["user_data_path"]}')
+
+    # Sites read from their feeds need the network log
+    if profile.get('network_log', False):
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+
+    if not profile.get('lean', False):
+        return options
+
+    for argument in LEAN_ARGUMENTS + profile.get('arguments', []):
+        options.add_argument(argument)
+
+    # Stop each tab's JavaScript using more than the cap, in MB
+    if profile.get('max_tab_memory'):
+        options.add_argument(f'--js-flags=--max-old-space-size={profile["max_tab_memory"]}')
+
+    # Blocked domains don't resolve at all, in every tab
+    if profile.get('blocked_domains'):
+        rules = ', '.join(f'MAP {domain} ~NOTFOUND, MAP *.{domain} ~NOTFOUND' for domain in profile['blocked_domains'])
+        options.add_argument(f'--host-resolver-rules={rules}')
+
+    if 'image' in profile.get('blocked_resources', []):
+        options.add_argument('--blink-settings=imagesEnabled=false')
+        options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+
+    # Eager page loads return once the page has been parsed, without waiting for everything it loads
+    options.set_capability('pageLoadStrategy', profile.get('page_load_strategy', 'normal'))
+    return options
+
+
+# Blocks the profile's resource types in the current tab. Chrome only blocks URLs in the tabs it's told to, so this is
+# needed for every new tab, before it loads anything
+def block_resources(driver):
+    urls = blocked_urls(getattr(driver, 'browser_profile', {}))
+    if not urls:
+        return
+
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': urls})
+    except WebDriverException:
+        pass
+
+
+# Starts Chrome with a site's browser profile, or the given profile, in a profile directory no other Chrome is using
+def initialise_webdriver(site, profile=None):
+    if profile is None:
+        profile = get_profile(site)
+    profile = {**profile, 'user_data_path': user_data_path(site, profile.get('user_data_directory'))}
+
+    try:
+        driver = webdriver.Chrome(chromedriver_path(), options=create_options(profile))
+    except SessionNotCreatedException:
+        utils.pinput('Please update your version of Google Chrome. If it\'s up to date and still not working, please '
+                     'message me on GitHub.\nPress Enter to quit.')
+        utils.quit_program()
+
+    # Kept with the driver so new tabs and the site can be set up the same way, and so it can be recycled when it's old
+    driver.browser_profile = profile if profile.get('lean', False) else {}
+    driver.user_data_path = profile['user_data_path']
+    driver.started_at = time.time()
+    driver.pages_loaded = 0
+    block_resources(driver)
+    return driver
+
+
+# Loads a page, counting it so the browser can be recycled once it's loaded too many
+def load_page(driver, url):
+    driver.pages_loaded += 1
+    driver.get(url)
+
+
+# Gets the memory used by a driver's Chrome, in MB, adding up every Chrome process. None if psutil isn't installed
+def get_rss(driver):
+    if not psutil_installed:
+        return None
+
+    try:
+        process = psutil.Process(driver.service.process.pid)
+        processes = [process] + process.children(recursive=True)
+    except psutil.Error:
+        return None
+
+    rss = 0
+    for child in processes:
+        try:
+            rss += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return rss / 1024 ** 2
@@ -1,4 +1,4 @@
-from sympy import symbols, solve, Eq
+import numpy as np
 
 from . import utils
 
@@ -6,210 +6,64 @@ from . import utils
 MIN_PROFIT_PERCENT = 7 / 100
 
 
-# Unrounded calculations for two way bets
-def two_way_unrounded_calculations(odds1, odds2, total_stake):
-    x, y = symbols('x y')
+# Unrounded stakes for a batch of bets. Each row of odds is one bet with any number of outcomes, and the total stake is
+# split in proportion to the reciprocal of each outcome's odds so every outcome returns the same amount
+def unrounded_stakes(odds, total_stake):
+    odds = np.atleast_2d(np.asarray(odds, dtype=float))
+    reciprocals = 1 / odds
+    stakes = total_stake * reciprocals / reciprocals.sum(axis=1, keepdims=True)
 
-    # Equation for total stake
-    total_stake_eq = Eq(x + y - total_stake, 0)
+    # Stakes only need to be accurate to the cent
+    return np.round(stakes, 2)
 
-    # Odds multiplied by their stake must be equal
-    individual_stakes_eq = Eq((odds2 * y) - (odds1 * x), 0)
 
-    # Solve equations to get stakes and return
-    stakes = solve((total_stake_eq, individual_stakes_eq), (x, y))
-    stake1 = float(stakes[x])
-    stake2 = float(stakes[y])
-    return stake1, stake2
+# Recalculate a batch of bets with stakes rounded to the nearest rounding_base
+def rounded_calculations(odds, stakes, total_stake, rounding_base):
+    odds = np.atleast_2d(np.asarray(odds, dtype=float))
+    stakes = utils.round_to(np.atleast_2d(stakes), rounding_base)
 
-
-# Recalculate two way bet values with rounding
-def two_way_rounded_calculations(odds1, odds2, stake1, stake2, total_stake, rounding_base):
-    # New values for stakes
-    stake1 = utils.round_to(stake1, rounding_base)
-    stake2 = utils.round_to(stake2, rounding_base)
-
-    # Stakes should add to less than total stake, if not, recalculate
-    if stake1 + stake2 > total_stake:
-        stake2 = total_stake - stake1
+    # Stakes should add to less than total stake, if not, recalculate the last one
+    over_stake = stakes.sum(axis=1) > total_stake
+    stakes[over_stake, -1] = total_stake - stakes[over_stake, :-1].sum(axis=1)
 
     # Calculate profits and percentage benefits
-    profit1 = odds1 * stake1 - total_stake
-    profit2 = odds2 * stake2 - total_stake
-    benefit1 = f'{profit1 / total_stake * 100:.2f}%'
-    benefit2 = f'{profit2 / total_stake * 100:.2f}%'
-
-    # Create and return a dictionary storing the values
-    values_dict = {
-        'Odds 1': odds1,
-        'Odds 2': odds2,
-        'Stake 1': stake1,
-        'Stake 2': stake2,
-        'Profit 1': profit1,
-        'Profit 2': profit2,
-        'Benefit 1': benefit1,
-        'Benefit 2': benefit2
-    }
-    return values_dict
-
-
-# Unrounded calculations for three way bets
-def three_way_unrounded_calculations(odds1, odds2, odds3, total_stake):
-    x, y, z = symbols('x y z')
+    profits = odds * stakes - total_stake
+    benefits = profits / total_stake * 100
+    return stakes, profits, benefits
 
-    # Equation for total stake
-    total_stake_eq = Eq(x + y + z - total_stake, 0)
 
-    # Odds multiplied by their stake must be equal
-    individual_stakes_eq1 = Eq((odds2 * y) - (odds1 * x), 0)
-    individual_stakes_eq2 = Eq((odds3 * z) - (odds2 * y), 0)
+# Solve and round stakes for a batch of bets in one go, returning the stakes, profits and percentage benefits
+def calculate_bets(odds, total_stake, rounding_base):
+    stakes = unrounded_stakes(odds, total_stake)
+    return rounded_calculations(odds, stakes, total_stake, rounding_base)
 
-    # Solve equations to get stakes and return
-    stakes = solve((total_stake_eq, individual_stakes_eq1, individual_stakes_eq2), (x, y, z))
-    stake1 = float(stakes[x])
-    stake2 = float(stakes[y])
-    stake3 = float(stakes[z])
-    return stake1, stake2, stake3
 
-
-# Recalculate three way bet values with rounding
-def three_way_rounded_calculations(odds1, odds2, odds3, stake1, stake2, stake3, total_stake, rounding_base):
-    # New values for stakes
-    stake1 = utils.round_to(stake1, rounding_base)
-    stake2 = utils.round_to(stake2, rounding_base)
-    stake3 = utils.round_to(stake3, rounding_base)
-
-    # Stakes should add to less than total stake, if not, recalculate
-    if stake1 + stake2 + stake3 > total_stake:
-        stake3 = total_stake - (stake1 + stake2)
-
-    # Calculate profits and percentage benefits
-    profit1 = odds1 * stake1 - total_stake
-    profit2 = odds2 * stake2 - total_stake
-    profit3 = odds3 * stake3 - total_stake
-    benefit1 = f'{profit1 / total_stake * 100:.2f}%'
-    benefit2 = f'{profit2 / total_stake * 100:.2f}%'
-    benefit3 = f'{profit3 / total_stake * 100:.2f}%'
-
-    # Create and return a dictionary storing the values
-    values_dict = {
-        'Odds 1': odds1,
-        'Odds 2': odds2,
-        'Odds 3': odds3,
-        'Stake 1': stake1,
-        'Stake 2': stake2,
-        'Stake 3': stake3,
-        'Profit 1': profit1,
-        'Profit 2': profit2,
-        'Profit 3': profit3,
-        'Benefit 1': benefit1,
-        'Benefit 2': benefit2,
-        'Benefit 3': benefit3
-    }
+# Create a dictionary storing the values for a single bet
+def create_bet_dict(odds, stakes, profits, benefits):
+    outcomes = range(1, len(odds) + 1)
+    values_dict = {}
+    values_dict.update({f'Odds {i}': value for i, value in zip(outcomes, odds)})
+    values_dict.update({f'Stake {i}': value for i, value in zip(outcomes, stakes)})
+    values_dict.update({f'Profit {i}': value for i, value in zip(outcomes, profits)})
+    values_dict.update({f'Benefit {i}': f'{value:.2f}%' for i, value in zip(outcomes, benefits)})
     return values_dict
 
 
-# Perform calculations for two way bets
-def two_way_bets(surebets_df, bet_dicts, broker_pair, market, total_stake, rounding_base):
-    # Need to go through both columns of odds
-    for col in [1, 2]:
-        for i, value in enumerate(surebets_df[f'{market}_surebets_{col}']):
-
-            # Check that the surebet is in this column
-            if not value < 1:
-                continue
+# Perform calculations for all bets in a surebet dataframe with any number of outcomes
+def market_bets(surebets_df, bet_dicts, broker_combo, market, outcomes, total_stake, rounding_base):
+    # Calculate the stakes, profits and benefits for every bet at once
+    odds = surebets_df[[f'Odds {i + 1}' for i in range(outcomes)]].to_numpy(dtype=float)
+    stakes, profits, benefits = calculate_bets(odds, total_stake, rounding_base)
 
-            # If in second column, swap broker names to make bets easier to find
-            if col == 2:
-                broker_pair = '-'.join([broker_pair.split('-')[1], broker_pair.split('-')[0]])
+    # If rounded values don't result in a profit of at least MIN_PROFIT_PERCENT, consider bet unsafe
+    safe = (profits > MIN_PROFIT_PERCENT * total_stake).all(axis=1)
+    if not safe.all():
+        print(f'Found {(~safe).sum()} unsafe bet(s), discarding')
 
-            # Get odds values
-            try:
-                odds1 = float([utils.convert_odds(odd) for odd in surebets_df.at[i, f'{market}_x'].split('\n')][0])
-                odds2 = float([utils.convert_odds(odd) for odd in surebets_df.at[i, f'{market}_y'].split('\n')][1])
-            except KeyError:
-                continue
-
-            competitors = surebets_df.iloc[i, surebets_df.columns.get_loc('Competitors_x')]
-
-            # Calculate the stakes required and the profit and benefit from the bet
-            stake1, stake2 = two_way_unrounded_calculations(odds1, odds2, total_stake)
-
-            # Calculate the same values for the stakes when rounded to the nearest rounding_base
-            bet_dict = two_way_rounded_calculations(odds1, odds2, stake1, stake2, total_stake, rounding_base)
-
-            # If rounded values don't result in a profit of at least 5%, consider bet unsafe
-            if not (bet_dict['Profit 1'] > MIN_PROFIT_PERCENT * total_stake and
-                    bet_dict['Profit 2'] > MIN_PROFIT_PERCENT * total_stake):
-                print('Found unsafe bet, discarding')
-                continue
-
-            # Save to bet_dicts with competitors as key
-            try:
-                bet_dicts[market][broker_pair][competitors] = bet_dict
-            except KeyError:
-                bet_dicts[market][broker_pair] = {}
-                bet_dicts[market][broker_pair][competitors] = bet_dict
-
-    return bet_dicts
-
-
-# Perform calculations for three way bets
-def three_way_bets(surebets_df, bet_dicts, broker_pair, market, total_stake, rounding_base):
-    # Need to go through both columns of odds
-    for col in [1, 2, 3, 4, 5, 6]:
-        for i, value in enumerate(surebets_df[f'{market}_surebets_{col}']):
-
-            # Check that the surebet is in this column
-            if not value < 1:
-                continue
-
-            # Reorganise brokers to make it easier to find bets
-            brokers = broker_pair.split('-')
-
-            if col == 1:
-                broker_combo = '-'.join([brokers[0], brokers[1], brokers[2]])
-            elif col == 2:
-                broker_combo = '-'.join([brokers[0], brokers[2], brokers[1]])
-            elif col == 3:
-                broker_combo = '-'.join([brokers[1], brokers[0], brokers[2]])
-            elif col == 4:
-                broker_combo = '-'.join([brokers[1], brokers[2], brokers[0]])
-            elif col == 5:
-                broker_combo = '-'.join([brokers[2], brokers[0], brokers[1]])
-            else:
-                broker_combo = '-'.join([brokers[2], brokers[1], brokers[0]])
-
-            # Get odds values
-            try:
-                odds1 = float([utils.convert_odds(odd) for odd in surebets_df.at[i, f'{market}_x'].split('\n')][0])
-                odds2 = float([utils.convert_odds(odd) for odd in surebets_df.at[i, f'{market}_y'].split('\n')][1])
-                odds3 = float([utils.convert_odds(odd) for odd in surebets_df.at[i, f'{market}_y'].split('\n')][2])
-            except KeyError:
-                continue
-
-            competitors = surebets_df.iloc[i, surebets_df.columns.get_loc('Competitors_x')]
-
-            # Calculate the stakes required and the profit and benefit from the bet
-            stake1, stake2, stake3 = three_way_unrounded_calculations(odds1, odds2, odds3, total_stake)
-
-            # Calculate the same values for the stakes when rounded to the nearest rounding_base
-            bet_dict = three_way_rounded_calculations(odds1, odds2, odds3, stake1, stake2, stake3, total_stake,
-                                                      rounding_base)
-
-            # If rounded values don't result in a profit greater than 5%, consider bet unsafe
-            if not (bet_dict['Profit 1'] > MIN_PROFIT_PERCENT * total_stake and
-                    bet_dict['Profit 2'] > MIN_PROFIT_PERCENT * total_stake and
-                    bet_dict['Profit 3'] > MIN_PROFIT_PERCENT * total_stake):
-                print('Found unsafe bet, discarding')
-                continue
-
-            # Save to bet_dicts with competitors as key
-            try:
-                bet_dicts[market][broker_combo][competitors] = bet_dict
-            except KeyError:
-                bet_dicts[market][broker_combo] = {}
-                bet_dicts[market][broker_combo][competitors] = bet_dict
+    # Save to bet_dicts with competitors as key
+    for competitors, *values in zip(surebets_df['Competitors'][safe], odds[safe].tolist(), stakes[safe].tolist(),
+                                    profits[safe].tolist(), benefits[safe].tolist()):
+        bet_dicts[market][broker_combo][competitors] = create_bet_dict(*values)
 
     return bet_dicts
 
@@ -222,16 +76,13 @@ def do_surebet_calculations(all_surebets, three_way_markets, total_stake, roundi
     # Iterate through markets in dictionary
     for market in all_surebets:
         bet_dicts[market] = {}
+        outcomes = 3 if market in three_way_markets else 2
 
-        # Iterate through broker pairs in market
-        for broker_pair in all_surebets[market]:
-            surebets_df = all_surebets[market][broker_pair]
-            bet_dicts[market][broker_pair] = {}
-
-            if market in three_way_markets:
-                bet_dicts = three_way_bets(surebets_df, bet_dicts, broker_pair, market, total_stake, rounding_base)
-            else:
-                bet_dicts = two_way_bets(surebets_df, bet_dicts, broker_pair, market, total_stake, rounding_base)
+        # Iterate through broker combinations in market
+        for broker_combo in all_surebets[market]:
+            surebets_df = all_surebets[market][broker_combo]
+            bet_dicts[market][broker_combo] = {}
+            bet_dicts = market_bets(surebets_df, bet_dicts, broker_combo, market, outcomes, total_stake, rounding_base)
 
     # Finally, return the dictionary of surebets with profits
     return bet_dicts
@@ -0,0 +1,170 @@
+import multiprocessing
+import os
+import signal
+
+from . import arbitrage, events, odds, three_way, tracing, two_way, utils
+
+# The pool of processes markets are checked for surebets on, once it's been started. See start_pool
+pool = None
+
+
+# Sets up a detection pool process with the main process's tracing settings. Ctrl+C is used to skip the wait between
+# cycles, so only the main process should handle it, and any spans it was forked with are dropped so they aren't sent
+# back twice
+def init_pool(tracing_config):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    tracing.config.update(tracing_config)
+    tracing.take_spans()
+
+
+# Starts the detection pool with a number of processes, defaulting to the "processes" detection setting, where 0 means
+# one for each CPU. Nothing is started for one process. It's started once and used for every cycle, so should be
+# started before the site workers to keep it from being forked with their threads
+def start_pool(processes=None):
+    global pool
+    if processes is None:
+        processes = utils.get_setting('detection', 'processes')
+    processes = processes or os.cpu_count()
+
+    if pool is None and processes > 1:
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+        pool = context.Pool(processes, initializer=init_pool, initargs=(dict(tracing.config),))
+    return pool
+
+
+# Stops the detection pool, if it's running
+def stop_pool():
+    global pool
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+        pool = None
+
+
+# Gets the module that handles a market
+def market_module(market, three_way_markets):
+    return three_way if market in three_way_markets else two_way
+
+
+# Combines each broker's dataframes for different markets, stored as {market: {broker: df}}, into one dataframe per
+# broker
+def combine_market_dfs(market_dfs):
+    broker_dfs = {}
+    for market in market_dfs:
+        for broker in market_dfs[market]:
+            broker_dfs.setdefault(broker, []).append(market_dfs[market][broker])
+
+    return {broker: odds.combine_dfs(broker_dfs[broker]) if len(broker_dfs[broker]) > 1 else broker_dfs[broker][0]
+            for broker in broker_dfs}
+
+
+# Lines every broker's rows up with the index's events, once for all markets. Returns each broker's event IDs and
+# reversed flags, stored as {broker: (ids, reversed_rows)}
+def align_brokers(broker_dfs, event_index):
+    with tracing.span('align', brokers=len(broker_dfs), events=len(event_index['names'])):
+        return {broker: events.event_ids(event_index, broker, broker_dfs[broker]['Competitors'])
+                for broker in broker_dfs}
+
+
+# Gets what's needed to find a market's surebets from the combined broker dataframes and their alignments: the market,
+# the brokers with it, each one's odds for it and where its rows go, the event names and how many outcomes it has. These
+# are all the pool needs, so broker dataframes are never sent to it, only each market's odds
+def market_task(broker_dfs, alignments, event_names, market, three_way_markets):
+    module = market_module(market, three_way_markets)
+    brokers = [broker for broker in broker_dfs if odds.has_market(broker_dfs[broker], market)]
+    return (market, brokers, [module.market_odds(broker_dfs[broker], market) for broker in brokers],
+            [alignments[broker] for broker in brokers], list(event_names), module.OUTCOMES)
+
+
+# Finds a market's surebets from a market_task, with the market's odds read straight into a tensor without any more
+# copying or matching. Returns {broker_combo: surebet_df}, which is empty when fewer than two brokers have the market
+def find_market_surebets(market, brokers, broker_odds, broker_alignments, event_names, outcomes):
+    # Need at least two brokers to make a surebet
+    if len(brokers) < 2:
+        return {}
+
+    with tracing.span('find_surebets', market=market, brokers=len(brokers)) as attributes:
+        tensor = arbitrage.build_tensor(broker_odds, broker_alignments, len(event_names), market, outcomes)
+        surebets_dict = arbitrage.get_surebet_dfs(event_names, brokers, *arbitrage.find_surebets(tensor))
+        attributes['broker_combos'] = len(surebets_dict)
+
+    return surebets_dict
+
+
+# Finds a market's surebets in a pool process, sending the spans traced while doing so back with them
+def pool_find_market_surebets(*task):
+    return find_market_surebets(*task), tracing.take_spans()
+
+
+# Gets one market's surebets from the combined broker dataframes and their alignments, in this process
+def market_surebets(broker_dfs, alignments, event_names, market, three_way_markets):
+    return find_market_surebets(*market_task(broker_dfs, alignments, event_names, market, three_way_markets))
+
+
+# Gets every market's surebets from the combined broker dataframes and their alignments, on the pool if it's running.
+# Returns {market: {broker_combo: surebet_df}}, including markets without any
+def detect_markets(broker_dfs, alignments, event_names, markets, three_way_markets):
+    if pool is None or len(markets) <= 1:
+        return {market: market_surebets(broker_dfs, alignments, event_names, market, three_way_markets)
+                for market in markets}
+
+    tasks = [market_task(broker_dfs, alignments, event_names, market, three_way_markets) for market in markets]
+    results = pool.starmap(pool_find_market_surebets, tasks)
+
+    for _, market_spans in results:
+        tracing.add_spans(market_spans)
+    return {market: surebets_dict for market, (surebets_dict, _) in zip(markets, results)}
+
+
+# Starts finding the surebets for a market from the brokers that have reported it so far, stored as {broker: df}. On the
+# pool, this carries on in the background, otherwise it's done straight away. Returns the job, stored as
+# {'market': ..., 'result': ..., 'surebets': ...}, with the result being the pool's until the surebets are taken
+def start_market(market_dfs, market, three_way_markets, event_index):
+    broker_dfs = combine_market_dfs({market: market_dfs})
+    task = market_task(broker_dfs, align_brokers(broker_dfs, event_index), event_index['names'], market,
+                       three_way_markets)
+
+    if pool is None:
+        return {'market': market, 'result': None, 'surebets': find_market_surebets(*task)}
+    return {'market': market, 'result': pool.apply_async(pool_find_market_surebets, task), 'surebets': None}
+
+
+# Checks whether a job from start_market has finished
+def market_ready(job):
+    return job['result'] is None or job['result'].ready()
+
+
+# Waits for a job from start_market to finish and gets its surebets, adding the spans traced in the pool to this
+# process's
+def wait_for_market(job):
+    if job['result'] is not None:
+        job['surebets'], market_spans = job['result'].get()
+        tracing.add_spans(market_spans)
+        job['result'] = None
+    return job['surebets']
+
+
+# Gets surebets for every market at once. Each broker's markets are combined into one dataframe and its rows are lined
+# up with the index's events once, then each market's surebets are found from those, on the pool if it's running.
+# Returns surebets in the same structure as all_surebets in main
+def get_all_surebets(market_dfs, three_way_markets, event_index=None, markets=None):
+    broker_dfs = combine_market_dfs(market_dfs)
+    if markets is None:
+        markets = list(market_dfs)
+
+    if event_index is None:
+        event_index = events.build_index(broker_dfs)
+    alignments = align_brokers(broker_dfs, event_index)
+
+    all_surebets = {}
+    with tracing.span('detect_markets', markets=len(markets), pool=pool is not None):
+        market_surebets_dicts = detect_markets(broker_dfs, alignments, event_index['names'], markets, three_way_markets)
+
+    for market, surebets_dict in market_surebets_dicts.items():
+        if not surebets_dict:
+            print(f'No surebets found for {market.title()}!')
+            continue
+
+        all_surebets[market] = surebets_dict
+
+    return all_surebets
@@ -0,0 +1,245 @@
+import re
+import unicodedata
+
+import numpy as np
+from fuzzywuzzy import fuzz
+
+from . import aliases, matching
+
+# Splits competitor strings into home and away teams
+COMPETITOR_SEPARATOR = re.compile(r'\s+(?:-|v|vs\.?|@)\s+|\n', re.IGNORECASE)
+
+# Youth and reserve team markers written in different ways, e.g. "U-21" or "Under 21"
+YOUTH_TOKEN = re.compile(r'\b(?:u|under)[\s-]?(\d{2})\b')
+
+# Tokens that only describe the type of club, which brokers add or leave out as they like
+CLUB_TOKENS = {'fc', 'afc', 'cf', 'sc', 'ac', 'fk', 'sk', 'cd', 'bk', 'if', 'sv', 'club'}
+
+# Tokens that mean the same thing but are written differently between brokers
+TOKEN_REPLACEMENTS = {'utd': 'united', 'st': 'saint', 'women': 'w', 'womens': 'w', 'ladies': 'w', 'res': 'reserves',
+                      'reserve': 'reserves'}
+
+# Tokens that mark a club's youth, reserve, second or women's team, which is never the same event as its first team
+MARKER_TOKENS = {'ii', 'b', 'w', 'reserves'}
+YOUTH_MARKER = re.compile(r'u\d{2}')
+
+
+# Normalises a single team name to a string of comparable tokens
+def normalise_team(team):
+    # Remove accents and case
+    team = unicodedata.normalize('NFKD', team).encode('ascii', 'ignore').decode().lower()
+
+    # Standardise youth team markers, then remove punctuation
+    team = YOUTH_TOKEN.sub(r'u\1', team)
+    team = re.sub(r'[^a-z0-9]+', ' ', team)
+
+    tokens = [TOKEN_REPLACEMENTS.get(token, token) for token in team.split()]
+    return ' '.join([token for token in tokens if token not in CLUB_TOKENS])
+
+
+# Splits competitors into normalised home and away team names
+def normalise_competitors(competitors):
+    return tuple(normalise_team(team) for team in COMPETITOR_SEPARATOR.split(competitors.strip()) if team.strip())
+
+
+# Key used to find exact matches, which doesn't depend on the order the teams are listed in
+def event_key(teams):
+    return ' - '.join(sorted(teams))
+
+
+# Checks whether teams are listed in the opposite order to an event's teams
+def is_reversed(teams, event_teams):
+    if len(teams) != 2 or len(event_teams) != 2:
+        return False
+
+    same_order = fuzz.ratio(teams[0], event_teams[0]) + fuzz.ratio(teams[1], event_teams[1])
+    opposite_order = fuzz.ratio(teams[0], event_teams[1]) + fuzz.ratio(teams[1], event_teams[0])
+    return opposite_order > same_order
+
+
+# Create an empty event index
+def create_index():
+    return {
+        'names': [],       # Competitor names to show for each event ID
+        'teams': [],       # Normalised teams for each event ID
+        'event_keys': [],  # Event key for each event ID
+        'keys': {},        # Event key to event ID for exact matches
+        'blocks': {},      # Token and markers to event IDs, so fuzzy matching only scores events that could match
+        'rows': {},        # Broker to competitor names and their (event ID, reversed) rows
+        'claimed': {},     # Broker to the event IDs it already has
+        'aliases': {},     # Broker to competitor names and their (event, reversed) aliases
+        'stored': {}       # Broker to the aliases loaded from the alias store, loaded once per index
+    }
+
+
+# Adds a new event to the index and returns its ID
+def add_event(index, competitors, teams, key):
+    event_id = len(index['names'])
+    index['names'].append(competitors)
+    index['teams'].append(teams)
+    index['event_keys'].append(key)
+    index['keys'].setdefault(key, event_id)
+
+    markers = key_markers(key)
+    for token in key_tokens(key):
+        index['blocks'].setdefault((token, markers), []).append(event_id)
+
+    return event_id
+
+
+# Tokens in an event key, used for blocking
+def key_tokens(key):
+    return set(key.split()) - {'-'}
+
+
+# Youth, reserve, second and women's team markers in an event key. Keys with different markers are never matched, as
+# token_set_ratio would otherwise score "arsenal - chelsea" against "arsenal u21 - chelsea u21" as a perfect match
+def key_markers(key):
+    return frozenset(token for token in key_tokens(key) if token in MARKER_TOKENS or YOUTH_MARKER.fullmatch(token))
+
+
+# Fuzzy match keys one-to-one against the events not yet claimed by a broker that share a token and markers with them.
+# Keys are grouped into the same blocks as the index's events, and each block is scored on its own, so only pairs that
+# could match are ever scored. Returns the matched event ID for each key, or -1 where there was no good enough match
+def match_events(index, keys, claimed, matcher=None):
+    key_blocks = {}
+    for row, key in enumerate(keys):
+        markers = key_markers(key)
+        for token in key_tokens(key):
+            key_blocks.setdefault((token, markers), []).append(row)
+
+    # Pairs sharing more than one token are scored in each of their blocks, which the assignment allows for
+    rows, cols, scores = [], [], []
+    score_block = matching.get_matcher(matcher)
+    for block, block_rows in key_blocks.items():
+        block_events = [event_id for event_id in index['blocks'].get(block, []) if event_id not in claimed]
+        if not block_events:
+            continue
+
+        block_scores = score_block([keys[row] for row in block_rows],
+                                   [index['event_keys'][event_id] for event_id in block_events])
+        rows.append(np.repeat(block_rows, len(block_events)))
+        cols.append(np.tile(block_events, len(block_rows)))
+        scores.append(block_scores.ravel())
+
+    if not rows:
+        return np.full(len(keys), -1, dtype=int)
+    return matching.assign_pairs(len(keys), np.concatenate(rows), np.concatenate(cols), np.concatenate(scores))
+
+
+# Checks an alias against the events not yet claimed by a broker, returning the event ID and reversed flag, or None if
+# the aliased event hasn't been seen yet this cycle
+def match_alias(index, alias, claimed):
+    alias_teams, alias_reversed = tuple(alias[0].split(' - ')), alias[1]
+    event_id = index['keys'].get(event_key(alias_teams))
+
+    if event_id is None or event_id in claimed:
+        return None
+
+    # Events are stored in the order they were first seen this cycle, which might not be the alias's order
+    event_teams = index['teams'][event_id]
+    if event_teams == alias_teams:
+        return event_id, alias_reversed
+    if event_teams == alias_teams[::-1]:
+        return event_id, not alias_reversed
+    return None
+
+
+# Give every one of a broker's competitor names an event ID. Names already in the index are skipped, so a broker can be
+# added again as more of its markets arrive. Known aliases skip scoring when their event has already been seen, exact
+# matches skip scoring too, and the rest are matched one-to-one in a single batch
+def add_broker(index, broker, competitors, known_aliases=None, matcher=None):
+    if known_aliases is None:
+        known_aliases = {}
+
+    rows = index['rows'].setdefault(broker, {})
+    broker_aliases = index['aliases'].setdefault(broker, {})
+
+    # A broker can only have each event once, so its names can't claim each other's events
+    claimed = index['claimed'].setdefault(broker, set())
+
+    # Teams and keys for names that still need matching
+    unmatched = {}
+
+    new_names = [name for name in dict.fromkeys(competitors) if name not in rows]
+
+    for name in new_names:
+        alias = known_aliases.get(name)
+        match = match_alias(index, alias, claimed) if alias else None
+
+        if match:
+            rows[name] = match
+            claimed.add(match[0])
+            continue
+
+        # Aliased names use the teams of the event they were first matched to, so they line up between runs
+        if alias:
+            teams = tuple(alias[0].split(' - '))
+            teams = teams[::-1] if alias[1] else teams
+        else:
+            teams = normalise_competitors(name)
+        key = event_key(teams)
+
+        # Exact matches skip scoring altogether
+        event_id = index['keys'].get(key)
+        if event_id is not None and event_id not in claimed:
+            rows[name] = (event_id, is_reversed(teams, index['teams'][event_id]))
+            claimed.add(event_id)
+        else:
+            unmatched[name] = (teams, key)
+
+    # Fuzzy match everything else in one batch, and add new events for anything left over
+    names = list(unmatched)
+    matched = match_events(index, [unmatched[name][1] for name in names], claimed, matcher)
+
+    for name, event_id in zip(names, matched.tolist()):
+        teams, key = unmatched[name]
+        if event_id == -1:
+            rows[name] = (add_event(index, name, teams, key), False)
+        else:
+            rows[name] = (event_id, is_reversed(teams, index['teams'][event_id]))
+        claimed.add(rows[name][0])
+
+    # Keep the aliases for every name, new names are stored against the event's teams
+    for name in new_names:
+        event_id, is_reversed_row = rows[name]
+        broker_aliases[name] = known_aliases.get(name, (' - '.join(index['teams'][event_id]), is_reversed_row))
+
+    return index
+
+
+# Add a broker's competitor names to the index, using and saving aliases if an alias store is given. The broker's
+# aliases are only loaded from the store the first time it's added, and only the names it hasn't been added with before
+# are saved, as a broker is added again with every market that arrives. The matcher is the name of one of the scorers in
+# matching.matchers
+def index_broker(index, broker, competitors, store=None, matcher=None):
+    if store and broker not in index['stored']:
+        index['stored'][broker] = aliases.load_aliases(store, broker)
+    known_aliases = index['stored'].get(broker)
+
+    saved_names = set(index['aliases'].get(broker, {}))
+    index = add_broker(index, broker, competitors, known_aliases, matcher)
+
+    if store:
+        broker_aliases = index['aliases'][broker]
+        new_aliases = {name: broker_aliases[name] for name in broker_aliases if name not in saved_names}
+        if new_aliases:
+            aliases.save_aliases(store, broker, new_aliases)
+
+    return index
+
+
+# Build the event index for every broker's dataframe. This only depends on the competitors, so only needs to be
+# done once per cycle for all markets
+def build_index(odds_dfs, store=None, matcher=None):
+    index = create_index()
+    for broker in odds_dfs:
+        index = index_broker(index, broker, odds_dfs[broker]['Competitors'].tolist(), store, matcher)
+    return index
+
+
+# Get the event IDs and reversed flags of a broker's competitors from the index
+def event_ids(index, broker, competitors):
+    rows = [index['rows'][broker][name] for name in competitors]
+    return np.array([row[0] for row in rows], dtype=int), np.array([row[1] for row in rows], dtype=bool)
+
@@ -0,0 +1,245 @@
+# Reads odds from the JSON feeds a site's page loads its odds from, rather than from the page itself. Chrome's network
+# log is read for responses and WebSocket messages from the feed's URLs, and each payload is parsed into the same odds
+# dictionary the site scrapers build, using the key names set in the site's "feed" settings. Payloads can be saved and
+# parsed again later without the site, e.g. with parse_feed.py
+import fnmatch
+import json
+import os
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+from . import browser, odds, tracing, utils
+
+# Where each part of the odds is found in a payload, unless a site's feed settings say otherwise. Paths are keys
+# separated by dots, where * is every item of a list or object. Events are found in the payload, markets in an event,
+# outcomes in a market and the rest in whatever they describe
+DEFAULT_FEED = {
+    'url_patterns': [],
+    'events': 'events',
+    'competitors': None,
+    'home': 'home',
+    'away': 'away',
+    'markets': 'markets',
+    'market_name': 'name',
+    'market_names': {},
+    'outcomes': 'outcomes',
+    'odds': 'odds',
+    'odds_numerator': None,
+    'odds_denominator': None,
+    'suspended': None,
+    'wait': 10,
+    'settle': 1
+}
+
+
+# Gets a site's feed settings
+def get_feed(site):
+    return {**DEFAULT_FEED, **utils.get_site_setting(site, 'feed')}
+
+
+# Finds every value at a path in some JSON
+def find(data, path):
+    values = [data]
+
+    for key in path.split('.') if path else []:
+        found = []
+        for value in values:
+            if key == '*' and isinstance(value, dict):
+                found.extend(value.values())
+            elif key == '*' and isinstance(value, list):
+                found.extend(value)
+            elif isinstance(value, dict) and key in value:
+                found.append(value[key])
+            elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+                found.append(value[int(key)])
+        values = found
+
+    return values
+
+
+# Finds every item at a path in some JSON, where lists found give each of their items. Objects keyed by ID need a * on
+# the end of the path
+def find_items(data, path):
+    items = []
+    for value in find(data, path):
+        if isinstance(value, list):
+            items.extend(value)
+        else:
+            items.append(value)
+    return items
+
+
+# Finds the first value at a path in some JSON, or None
+def find_value(data, path):
+    if path is None:
+        return None
+
+    values = find(data, path)
+    return values[0] if values else None
+
+
+# Gets an outcome's odds as the sites show them, so they're parsed the same way
+def outcome_odds(outcome, feed):
+    if feed['suspended'] is not None and find_value(outcome, feed['suspended']):
+        return 'SUSP'
+
+    if feed['odds_numerator'] is not None:
+        numerator = find_value(outcome, feed['odds_numerator'])
+        denominator = find_value(outcome, feed['odds_denominator'])
+        return '' if numerator is None or denominator is None else f'{numerator}/{denominator}'
+
+    value = find_value(outcome, feed['odds'])
+    return '' if value is None else str(value)
+
+
+# Gets an event's competitors, joined the same way as the sites show them
+def event_competitors(event, feed):
+    if feed['competitors'] is not None:
+        competitors = find_value(event, feed['competitors'])
+        return None if competitors is None else str(competitors)
+
+    home, away = find_value(event, feed['home']), find_value(event, feed['away'])
+    if home is None or away is None:
+        return None
+    return f'{str(home).strip()}{odds.COMPETITOR_SEPARATOR}{str(away).strip()}'
+
+
+# Parses feed payloads into the odds dictionary the sites build, for the markets asked for, or every market if None.
+# Later payloads update the odds from earlier ones, as feeds send updates for events they've already sent
+def parse_payloads(payloads, feed, markets=None):
+    market_rows = {}
+
+    for payload in payloads:
+        for event in find_items(payload, feed['events']):
+            competitors = event_competitors(event, feed)
+            if competitors is None:
+                continue
+
+            for event_market in find_items(event, feed['markets']):
+                name = find_value(event_market, feed['market_name'])
+                market = feed['market_names'].get(name, name)
+                if market is None or markets is not None and market not in markets:
+                    continue
+
+                outcomes = find_items(event_market, feed['outcomes'])
+                market_rows.setdefault(market, {})[competitors] = [outcome_odds(outcome, feed) for outcome in outcomes]
+
+    return {market: {'Competitors': list(rows), 'Odds': list(rows.values())} for market, rows in market_rows.items()}
+
+
+# Parses some text as JSON, allowing for the prefixes some WebSocket protocols put before it. None if it isn't JSON
+def parse_json(text):
+    starts = [position for position in (text.find('{'), text.find('[')) if position != -1]
+    for start in [0] + sorted(starts):
+        try:
+            return json.loads(text[start:])
+        except ValueError:
+            continue
+    return None
+
+
+# Reads the payloads the page has received from the feed's URLs since the network log was last read. Responses are
+# only read once they've finished loading, so the requests they belong to are kept with the driver between reads
+def read_payloads(driver, feed):
+    if not hasattr(driver, 'feed_requests'):
+        driver.feed_requests = {}
+    requests = driver.feed_requests
+    payloads = []
+
+    for entry in driver.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        method, params = message.get('method'), message.get('params', {})
+
+        if method in ('Network.responseReceived', 'Network.webSocketCreated'):
+            url = params['response']['url'] if method == 'Network.responseReceived' else params['url']
+            if any(fnmatch.fnmatch(url, pattern) for pattern in feed['url_patterns']):
+                requests[params['requestId']] = url
+
+        elif method == 'Network.loadingFinished' and params.get('requestId') in requests:
+            try:
+                body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': params['requestId']})
+            except WebDriverException:
+                continue
+            finally:
+                requests.pop(params['requestId'], None)
+
+            if not body.get('base64Encoded'):
+                payloads.append(parse_json(body['body']))
+
+        elif method == 'Network.webSocketFrameReceived' and params.get('requestId') in requests:
+            payloads.append(parse_json(params['response']['payloadData']))
+
+        elif method == 'Network.webSocketClosed':
+            requests.pop(params.get('requestId'), None)
+
+    return [payload for payload in payloads if payload is not None]
+
+
+# Reads payloads until the feed has gone quiet for the feed's settle time, or its wait time has passed
+def capture_payloads(driver, feed):
+    payloads = []
+    start = last_payload = time.time()
+
+    while time.time() - start < feed['wait']:
+        new_payloads = read_payloads(driver, feed)
+        if new_payloads:
+            payloads.extend(new_payloads)
+            last_payload = time.time()
+        elif payloads and time.time() - last_payload >= feed['settle']:
+            break
+        time.sleep(0.25)
+
+    return payloads
+
+
+# Saves payloads as JSON, so they can be parsed again later without the site
+def save_payloads(payloads, site, directory):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{site}-{time.strftime("%Y%m%d-%H%M%S")}.json')
+    with open(path, 'w') as payloads_file:
+        json.dump(payloads, payloads_file)
+    return path
+
+
+# Loads saved payloads
+def load_payloads(path):
+    with open(path) as payloads_file:
+        return json.load(payloads_file)
+
+
+# Scrapes the odds for a sport from a site's feed using an open session. The site's page is only used to get to the
+# sport, which makes it load the feed, so no rows are read from the page. Returns and publishes odds like the sites
+def scrape(driver, site, module, sport, markets=None, publish=None):
+    if markets is None:
+        markets = []
+    feed = get_feed(site)
+
+    # Throw away anything received before this scrape
+    read_payloads(driver, feed)
+
+    browser.load_page(driver, module.SITE_LINK)
+    if not module.select_sport(driver, sport):
+        print(f'- {site}: No live {sport.lower()} available right now.')
+        return {}
+
+    with tracing.span('capture_feed') as attributes:
+        payloads = capture_payloads(driver, feed)
+        attributes['payloads'] = len(payloads)
+
+    if utils.get_setting('feeds', 'save_payloads'):
+        save_payloads(payloads, site, utils.get_setting('feeds', 'directory'))
+
+    with tracing.span('parse_feed', payloads=len(payloads)):
+        odds_dict = parse_payloads(payloads, feed, markets)
+
+    if not odds_dict:
+        print(f'- {site}: No odds found in the feed')
+        return {}
+
+    if publish is not None:
+        for market in odds_dict:
+            publish(market, odds_dict[market])
+
+    print(f'- {site}: Returned odds')
+    return odds_dict
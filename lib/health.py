@@ -0,0 +1,82 @@
+# Keeps track of how each site has been doing, so a site that keeps failing stops slowing every cycle down. Each site
+# has a circuit breaker: it's closed while the site works, opens after the "failure_threshold" failures in a row from
+# the health settings, so the site is skipped, then goes half open once its backoff has passed, so the next cycle
+# probes it. A successful probe closes the circuit again, and a failed one opens it for twice as long as before
+import time
+
+from . import utils
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# How many of each site's most recent failure causes are kept
+MAX_CAUSES = 10
+
+# Each site's circuit, stored as {site: circuit}. See get_circuit
+circuits = {}
+
+
+# Gets a site's circuit, starting it closed
+def get_circuit(site):
+    return circuits.setdefault(site, {'state': CLOSED, 'failures': 0, 'opened_at': None, 'backoff': 0,
+                                      'causes': []})
+
+
+# Checks whether a site should be sent a job this cycle. An open circuit whose backoff has passed goes half open, so
+# the site gets one job to probe whether it's working again
+def allow(site):
+    circuit = get_circuit(site)
+
+    if circuit['state'] == OPEN and time.time() - circuit['opened_at'] >= circuit['backoff']:
+        circuit['state'] = HALF_OPEN
+        print(f'- {site}: Probing after {circuit["backoff"]:.0f}s')
+
+    return circuit['state'] != OPEN
+
+
+# Records that a site finished a job without failing, closing its circuit
+def record_success(site):
+    circuit = get_circuit(site)
+
+    if circuit['state'] != CLOSED:
+        print(f'- {site}: Working again')
+
+    circuit.update({'state': CLOSED, 'failures': 0, 'opened_at': None, 'backoff': 0})
+
+
+# Records why a site failed a job, opening its circuit if it's failed too many times in a row or a probe has failed.
+# Each time the circuit opens, the site is skipped for twice as long, up to the "max_backoff" setting
+def record_failure(site, cause):
+    circuit = get_circuit(site)
+    circuit['failures'] += 1
+    circuit['causes'] = (circuit['causes'] + [{'time': time.time(), 'cause': cause}])[-MAX_CAUSES:]
+
+    if circuit['state'] != HALF_OPEN and circuit['failures'] < utils.get_setting('health', 'failure_threshold'):
+        return
+
+    backoff = circuit['backoff'] * 2 if circuit['backoff'] else utils.get_setting('health', 'backoff')
+    circuit.update({'state': OPEN, 'opened_at': time.time(),
+                    'backoff': min(backoff, utils.get_setting('health', 'max_backoff'))})
+    print(f'- {site}: Skipping for {circuit["backoff"]:.0f}s after {circuit["failures"]} failure(s) in a row '
+          f'({cause})')
+
+
+# Gets the sites whose circuits are open, with the cause of their last failure
+def open_sites():
+    return {site: circuit['causes'][-1]['cause'] for site, circuit in circuits.items()
+            if circuit['state'] == OPEN and circuit['causes']}
+
+
+# Calls a function, trying again with exponential backoff if it raises one of the exceptions given, up to the "retries"
+# setting. The last attempt's exception is raised if every attempt fails
+def retry(function, *args, exceptions=(Exception,), delay=0.5):
+    attempts = utils.get_setting('health', 'retries') + 1
+
+    for attempt in range(attempts):
+        try:
+            return function(*args)
+        except exceptions:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(delay * 2 ** attempt)
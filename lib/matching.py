@@ -0,0 +1,57 @@
+import numpy as np
+from fuzzywuzzy import fuzz
+
+rapidfuzz_installed = True
+
+try:
+    from rapidfuzz import process as rapidfuzz_process, fuzz as rapidfuzz_fuzz
+except ModuleNotFoundError:
+    rapidfuzz_installed = False
+
+MIN_MATCHING_SCORE = 75
+
+
+# Scores every query against every choice with fuzzywuzzy
+def fuzzywuzzy_scores(queries, choices):
+    scores = np.zeros((len(queries), len(choices)))
+    for i, query in enumerate(queries):
+        scores[i] = [fuzz.token_set_ratio(query, choice) for choice in choices]
+    return scores
+
+
+# Scores every query against every choice with rapidfuzz, which does the whole matrix in one call
+def rapidfuzz_scores(queries, choices):
+    return rapidfuzz_process.cdist(queries, choices, scorer=rapidfuzz_fuzz.token_set_ratio, dtype=np.float64,
+                                   workers=-1)
+
+
+# Matchers that create a matrix of scores from 0 to 100 between two lists of competitor names
+matchers = {'fuzzywuzzy': fuzzywuzzy_scores}
+
+if rapidfuzz_installed:
+    matchers['rapidfuzz'] = rapidfuzz_scores
+
+DEFAULT_MATCHER = 'rapidfuzz' if rapidfuzz_installed else 'fuzzywuzzy'
+
+
+# Gets a matcher by name, falling back to the default if it isn't available
+def get_matcher(name=None):
+    return matchers.get(name, matchers[DEFAULT_MATCHER])
+
+
+# Solve a one-to-one assignment from scored pairs of queries and choices, taking the highest scores first. Pairs can be
+# repeated. Returns the matched choice for each of the query_count queries, or -1 where nothing scored above min_score
+def assign_pairs(query_count, rows, cols, scores, min_score=MIN_MATCHING_SCORE):
+    assigned = np.full(query_count, -1, dtype=int)
+    keep = scores > min_score
+    rows, cols, scores = rows[keep], cols[keep], scores[keep]
+    order = np.argsort(-scores, kind='stable')
+    taken = set()
+
+    for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+        if assigned[row] != -1 or col in taken:
+            continue
+        assigned[row] = col
+        taken.add(col)
+
+    return assigned
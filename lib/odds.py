@@ -0,0 +1,147 @@
+# Typed odds, parsed once when a market is scraped. Each market's odds are stored as float columns, one per outcome
+# listed, along with how many outcomes each row listed. Suspended, closed and unreadable outcomes are NaN
+import numpy as np
+import pandas as pd
+
+# Fractional odds, e.g. "5/4"
+FRACTION = r'^(\d+(?:\.\d+)?)\s*/\s*(\d+(?:\.\d+)?)$'
+
+# Ways brokers write odds of 1/1
+EVENS = ['EVS', 'EVENS', 'EVEN']
+
+# Splits competitors into home and away teams, which all the sites join with this
+COMPETITOR_SEPARATOR = ' - '
+
+
+# Column holding a market's odds for an outcome, counting from 1
+def outcome_column(market, outcome):
+    return f'{market} {outcome}'
+
+
+# Columns holding a market's odds for a number of outcomes
+def outcome_columns(market, outcomes):
+    return [outcome_column(market, outcome) for outcome in range(1, outcomes + 1)]
+
+
+# Column holding how many outcomes each row listed for a market
+def count_column(market):
+    return f'{market} Outcomes'
+
+
+# Checks whether a dataframe has odds for a market
+def has_market(df, market):
+    return count_column(market) in df
+
+
+# Gets every outcome column a dataframe has for a market, in order
+def market_columns(df, market):
+    outcomes = 0
+    while outcome_column(market, outcomes + 1) in df:
+        outcomes += 1
+    return outcome_columns(market, outcomes)
+
+
+# Parses odds written as decimals, decimals with commas, fractions or evens into decimal odds, all at once. Anything
+# else, like suspended or closed outcomes, is NaN
+def parse_odds(values):
+    values = pd.Series(values, dtype=object).fillna('').astype(str).str.strip().str.upper()
+
+    decimal = pd.to_numeric(values.str.replace(',', '.', regex=False), errors='coerce').to_numpy(dtype=float)
+
+    # Fractional odds ignore the initial stake, whereas decimal odds show the full return
+    fraction = values.str.extract(FRACTION).astype(float).to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fractional = fraction[:, 0] / fraction[:, 1] + 1
+
+    parsed = np.where(np.isnan(decimal), fractional, decimal)
+    parsed[values.isin(EVENS).to_numpy()] = 2.0
+
+    # Odds of 1 or less, or infinite ones from a zero denominator, can't be bet on
+    parsed[~np.isfinite(parsed) | (parsed <= 1)] = np.nan
+    return parsed
+
+
+# Splits competitors into home and away team columns
+def split_competitors(competitors):
+    competitors = pd.Series(competitors, dtype=object)
+    if competitors.empty:
+        return np.array([], dtype=object), np.array([], dtype=object)
+
+    teams = competitors.astype(str).str.split(COMPETITOR_SEPARATOR, n=1, expand=True).reindex(columns=[0, 1])
+    teams = teams.fillna('')
+    return teams[0].str.strip().to_numpy(dtype=object), teams[1].str.strip().to_numpy(dtype=object)
+
+
+# Creates a typed dataframe for a market from its competitors and the odds each row listed, which can be lists of
+# strings or newline-joined strings. Rows listing fewer outcomes than the most in the market are padded with NaN
+def market_df(market, competitors, odds_rows):
+    odds_rows = [row.split('\n') if isinstance(row, str) else list(row) for row in odds_rows]
+    counts = np.array([len(row) for row in odds_rows], dtype=int)
+    width = int(counts.max()) if len(counts) else 0
+
+    # Parse every value in the market in one go
+    padded = [value for row in odds_rows for value in row + [''] * (width - len(row))]
+    parsed = parse_odds(padded).reshape(len(odds_rows), width)
+
+    df = pd.DataFrame(parsed, columns=outcome_columns(market, width))
+    df.insert(0, count_column(market), counts)
+    df.insert(0, 'Competitors', list(competitors))
+    return df
+
+
+# Combines one broker's typed dataframes for different markets into one, with Competitors, Home and Away columns and
+# each market's outcome and count columns
+def combine_dfs(dfs):
+    df_list = []
+
+    for df in dfs:
+        df = df.drop(columns=['Home', 'Away'], errors='ignore').set_index('Competitors')
+
+        # An event listed twice would stop the markets lining up
+        df_list.append(df[~df.index.duplicated()])
+
+    if not df_list:
+        return pd.DataFrame(columns=['Competitors', 'Home', 'Away'])
+
+    # Line the markets up by competitors. Events missing from a market listed no outcomes for it
+    final_df = pd.concat(df_list, axis=1, sort=True)
+    final_df.index.name = 'Competitors'
+    final_df.reset_index(inplace=True)
+
+    for column in final_df.columns:
+        if column.endswith(' Outcomes'):
+            final_df[column] = final_df[column].fillna(0).astype(int)
+
+    home, away = split_competitors(final_df['Competitors'])
+    final_df.insert(1, 'Home', home)
+    final_df.insert(2, 'Away', away)
+    return final_df
+
+
+# Create a typed dataframe from the odds dictionary the sites build
+def create_df(odds_dict):
+    return combine_dfs([market_df(market, odds_dict[market]['Competitors'], odds_dict[market]['Odds'])
+                        for market in odds_dict])
+
+
+# Gets a market's odds for each row as an array with one column per outcome. Rows that listed a different number of
+# outcomes are NaN, unless keep_last is set, in which case rows that listed more keep their last ones, e.g. to skip the
+# goal line some brokers show before over/under odds
+def market_odds(df, market, outcomes, keep_last=False):
+    odds = df[market_columns(df, market)].to_numpy(dtype=float)
+    counts = df[count_column(market)].to_numpy(dtype=int)
+
+    if keep_last:
+        valid = counts >= outcomes
+        start = np.where(valid, counts - outcomes, 0)
+    else:
+        valid = counts == outcomes
+        start = np.zeros(len(counts), dtype=int)
+
+    selected = np.full((len(df), outcomes), np.nan)
+    if odds.shape[1] >= outcomes:
+        positions = start[:, None] + np.arange(outcomes)
+        selected = np.take_along_axis(odds, np.minimum(positions, odds.shape[1] - 1), axis=1)
+        selected[~valid] = np.nan
+
+    return selected
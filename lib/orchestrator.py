@@ -0,0 +1,179 @@
+import asyncio
+import itertools
+import queue
+import time
+
+from . import health, scheduler, tracing, transport, utils, workers
+
+# Every cycle gets its own ID, so results that arrive after their cycle has finished can be told apart
+cycle_ids = itertools.count(1)
+
+
+# Frees up workers whose results came too late for their cycle, throwing the late results away
+def drain_results(site_workers, results_queue):
+    while True:
+        try:
+            message = results_queue.get_nowait()
+        except queue.Empty:
+            return
+
+        if message['type'] == 'done' and message['broker'] in site_workers:
+            site_workers[message['broker']]['busy_since'] = None
+        transport.discard(message)
+
+
+# Starts a new cycle, reloading the settings and finding the sites that can be sent jobs. Workers that have died, or
+# have been busy for longer than the site's restart_after setting, are restarted first. Workers still busy with an
+# earlier cycle, and sites that keep failing, are skipped this time round. Returns the cycle ID, the sites to send jobs
+# to from highest priority to lowest and how many browsers can run at once this cycle
+def start_cycle(site_workers, results_queue):
+    utils.load_settings(reload=True)
+    drain_results(site_workers, results_queue)
+    cycle = next(cycle_ids)
+    sites = []
+
+    for site, worker in site_workers.items():
+        if not health.allow(site):
+            print(f'- {site}: Skipping, still failing ({health.open_sites()[site]})')
+            continue
+
+        if not worker['process'].is_alive():
+            print(f'- {site}: Worker died, restarting')
+            workers.restart_worker(worker, results_queue)
+        elif worker['busy_since'] is not None:
+            if time.time() - worker['busy_since'] < utils.get_site_setting(site, 'restart_after'):
+                print(f'- {site}: Still busy with an earlier cycle, skipping')
+                continue
+            print(f'- {site}: Worker stuck, restarting')
+            workers.restart_worker(worker, results_queue)
+
+        sites.append(site)
+
+    size = scheduler.pool_size(sum(worker['browser_open'] for worker in site_workers.values()))
+    print(f'- Running up to {size} browser(s) at once')
+    return cycle, scheduler.prioritise(sites), size
+
+
+# Makes room in the browser pool for a site, telling idle workers with open browsers to close them, lowest priority
+# first. Returns whether there's room
+def make_room(site_workers, site, size):
+    if site_workers[site]['browser_open']:
+        return True
+
+    open_workers = [worker for worker in site_workers.values() if worker['browser_open']]
+    idle_workers = [worker for worker in open_workers if worker['busy_since'] is None]
+    idle_workers.sort(key=lambda worker: scheduler.priority(worker['site']))
+
+    while len(open_workers) >= size and idle_workers:
+        worker = idle_workers.pop(0)
+        workers.close_browser(worker)
+        open_workers.remove(worker)
+
+    return len(open_workers) < size
+
+
+# Sends a site's worker its job, with the markets translated for the site
+def send_job(site_workers, cycle, sport, markets, site):
+    site_markets = [utils.translate_to_site_market(market, site) for market in markets]
+    workers.send_command(site_workers[site], cycle, sport, site_markets)
+    scheduler.record_job(site)
+    print(f'- {site}: Sending job')
+
+
+# Gets the next message from the results queue, or None if nothing arrives in time
+def get_message(results_queue, timeout):
+    try:
+        return results_queue.get(timeout=timeout)
+    except queue.Empty:
+        return None
+
+
+# Sends a cycle's jobs to the sites in order, as long as there's room in the browser pool, and collects their results
+# until every site is done, has missed its deadline or has died, or the cycle's deadline has passed. Each site's
+# deadline starts when it's sent its job. on_market is called with every market message that arrives in time, and
+# whatever a dropped site sent before being dropped is kept. on_wait, if given, is called at least once a second while
+# waiting, so work finished elsewhere can be handled without waiting for the next message. Every site's result is
+# recorded with its circuit breaker. Sites that don't get room in the pool before the cycle's deadline wait for the next
+# cycle, when they'll be staler. Returns the dropped sites with the reason they were dropped
+async def collect_results(site_workers, results_queue, cycle, sport, markets, sites, size, on_market, on_wait=None):
+    loop = asyncio.get_running_loop()
+    cycle_deadline = time.time() + utils.get_setting('cycle', 'deadline')
+    site_deadlines = {}
+
+    queued = list(sites)
+    pending = set()
+    dropped = {}
+
+    while True:
+        # Send jobs to the highest priority sites while there's room
+        while queued and time.time() < cycle_deadline and make_room(site_workers, queued[0], size):
+            site = queued.pop(0)
+            send_job(site_workers, cycle, sport, markets, site)
+            site_deadlines[site] = min(time.time() + utils.get_site_setting(site, 'deadline'), cycle_deadline)
+            pending.add(site)
+
+        # Sites still waiting for room can have it once a worker busy with an earlier cycle finishes
+        busy = [worker for worker in site_workers.values()
+                if worker['busy_since'] is not None and worker['process'].is_alive()]
+        if not pending and not (queued and busy and time.time() < cycle_deadline):
+            break
+
+        # Drop any sites that have run out of time or whose worker has died
+        now = time.time()
+        for site in sorted(pending):
+            if not site_workers[site]['process'].is_alive():
+                dropped[site] = 'worker died'
+                site_workers[site]['browser_open'] = False
+            elif now >= site_deadlines[site]:
+                dropped[site] = 'missed deadline'
+            else:
+                continue
+
+            pending.discard(site)
+            health.record_failure(site, dropped[site])
+            print(f'- {site}: Dropped from this cycle ({dropped[site]})')
+
+        if not pending and not busy:
+            continue
+
+        if on_wait is not None:
+            on_wait()
+
+        # Wait for the next message without blocking the event loop, checking the deadlines at least once a second
+        timeout = min([site_deadlines[site] - now for site in pending] + [cycle_deadline - now, 1])
+        message = await loop.run_in_executor(None, get_message, results_queue, max(timeout, 0))
+        if message is None:
+            continue
+
+        broker = message['broker']
+
+        # A finished worker is free for the next cycle, even if it finished too late for this one
+        if message['type'] == 'done' and broker in site_workers:
+            site_workers[broker]['busy_since'] = None
+
+        if message['cycle'] != cycle or broker not in pending:
+            transport.discard(message)
+            continue
+
+        if message['type'] == 'done':
+            pending.discard(broker)
+            tracing.add_spans(message.get('spans', []))
+
+            if message.get('error'):
+                health.record_failure(broker, message['error'])
+            else:
+                health.record_success(broker)
+        else:
+            on_market(message)
+
+    for site in queued:
+        print(f'- {site}: No room this cycle, waiting for the next one')
+
+    return dropped
+
+
+# Runs a whole cycle: sends the jobs out and collects the results within the deadlines
+def run_cycle(site_workers, results_queue, sport, markets, on_market, on_wait=None):
+    cycle, sites, size = start_cycle(site_workers, results_queue)
+    return asyncio.run(collect_results(site_workers, results_queue, cycle, sport, markets, sites, size, on_market,
+                                       on_wait))
@@ -0,0 +1,112 @@
+import glob
+import os
+import time
+
+import pandas as pd
+
+from . import odds
+
+parquet_installed = True
+
+try:
+    import pyarrow
+except ImportError:
+    parquet_installed = False
+
+# Recordings are saved as Parquet if pyarrow is installed, otherwise as compressed CSV
+RECORDING_EXTENSION = '.parquet' if parquet_installed else '.csv.gz'
+RECORDING_COLUMNS = ['Cycle Time', 'Sport', 'Broker', 'Market', 'Received', 'Competitors', 'Outcomes']
+
+
+# Creates an empty recording for a cycle
+def create_recording(sport):
+    return {'sport': sport, 'time': time.time(), 'frames': []}
+
+
+# Adds a broker's dataframe for a market to a cycle's recording, once it's been translated to standard market names.
+# The market's columns are renamed to Outcomes and Odds 1, 2, etc. so every market can go in the same table
+def record_market(recording, broker, market, received, df):
+    columns = odds.market_columns(df, market)
+    frame = df[['Competitors', odds.count_column(market)] + columns].rename(columns={
+        odds.count_column(market): 'Outcomes',
+        **{column: f'Odds {outcome}' for outcome, column in enumerate(columns, 1)}
+    })
+    frame.insert(0, 'Received', received)
+    frame.insert(0, 'Market', market)
+    frame.insert(0, 'Broker', broker)
+    recording['frames'].append(frame)
+    return recording
+
+
+# Saves a cycle's recording to its own file in the recordings directory, returning the path. Files are named after the
+# cycle's time to the millisecond, with a number added if a recording with the same name already exists, so recordings
+# never overwrite each other
+def save_recording(recording, directory):
+    if recording['frames']:
+        df = pd.concat(recording['frames'], ignore_index=True)
+    else:
+        df = pd.DataFrame(columns=RECORDING_COLUMNS[2:])
+
+    df.insert(0, 'Sport', recording['sport'])
+    df.insert(0, 'Cycle Time', recording['time'])
+    df = df.astype({'Competitors': str, 'Outcomes': int})
+
+    os.makedirs(directory, exist_ok=True)
+    file_name = time.strftime('cycle-%Y%m%d-%H%M%S', time.localtime(recording['time']))
+    file_name += f'-{int(recording["time"] * 1000) % 1000:03d}'
+    path = os.path.join(directory, file_name + RECORDING_EXTENSION)
+
+    copy = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f'{file_name}-{copy}{RECORDING_EXTENSION}')
+        copy += 1
+
+    if parquet_installed:
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+    return path
+
+
+# Finds recording files from a list of files and directories, oldest first
+def find_recordings(paths):
+    files = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            files += glob.glob(os.path.join(path, '*.parquet')) + glob.glob(os.path.join(path, '*.csv.gz'))
+        else:
+            files.append(path)
+
+    # Sorted without the extension, so copies of a recording come after it
+    return sorted(files, key=lambda file: (os.path.dirname(file), os.path.basename(file).split('.')[0]))
+
+
+# Loads a recording file as a list of cycles. Each cycle has its sport, time, and the messages main handled, in the
+# order they were received, each with a broker's dataframe for a market in the same shape main builds them
+def load_recording(path):
+    if path.endswith('.parquet'):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path, dtype={'Competitors': str}, keep_default_na=False, na_values=[''])
+
+    cycles = []
+    for (cycle_time, sport), cycle_df in df.groupby(['Cycle Time', 'Sport'], sort=True):
+        messages = []
+        for (received, broker, market), market_df in cycle_df.groupby(['Received', 'Broker', 'Market'], sort=True):
+            outcomes = range(1, int(market_df['Outcomes'].max()) + 1)
+            market_df = market_df[['Competitors', 'Outcomes'] + [f'Odds {outcome}' for outcome in outcomes]]
+            market_df = market_df.rename(columns={
+                'Outcomes': odds.count_column(market),
+                **{f'Odds {outcome}': odds.outcome_column(market, outcome) for outcome in outcomes}
+            }).reset_index(drop=True)
+
+            home, away = odds.split_competitors(market_df['Competitors'])
+            market_df.insert(1, 'Home', home)
+            market_df.insert(2, 'Away', away)
+            messages.append({'broker': broker, 'market': market, 'time': received, 'df': market_df})
+
+        cycles.append({'sport': sport, 'time': cycle_time, 'messages': messages})
+
+    return cycles
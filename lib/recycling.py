@@ -0,0 +1,53 @@
+# Replaces browsers that have been open too long, grown too big or loaded too many pages, as live pages that keep
+# updating use more and more memory the longer they're open. The limits are in the "recycling" settings, with 0 turning
+# a check off. The new browser is opened and set up in the background while the old one carries on, and is only swapped
+# in between jobs once it's ready, so the site never misses a cycle while it's being replaced
+import threading
+import time
+
+from . import browser, utils
+
+
+# Gets a driver's process tree RSS in MB (None if it can't be measured), pages loaded, counting every market tab, and
+# age in seconds
+def driver_stats(driver):
+    return {'rss': browser.get_rss(driver), 'pages': driver.pages_loaded, 'age': time.time() - driver.started_at}
+
+
+# Gets why a driver should be replaced, or None if it's within every limit
+def recycle_reason(driver):
+    stats = driver_stats(driver)
+    limits = [('rss', 'max_rss', 'MB'), ('pages', 'max_pages', ' pages'), ('age', 'max_age', 's')]
+
+    for stat, setting, unit in limits:
+        limit = utils.get_setting('recycling', setting)
+        if limit > 0 and stats[stat] is not None and stats[stat] >= limit:
+            return f'{stat} {stats[stat]:.0f}{unit}, limit {limit}{unit}'
+    return None
+
+
+# Opens a replacement browser in the background with open_session. Returns the replacement, stored as
+# {'thread': ..., 'driver': ..., 'error': ...}, with the driver set once it's ready
+def start_replacement(open_session):
+    replacement = {'thread': None, 'driver': None, 'error': None}
+
+    def warm_up():
+        try:
+            replacement['driver'] = open_session()
+        except Exception as e:
+            replacement['error'] = e.__class__.__name__
+
+    replacement['thread'] = threading.Thread(target=warm_up, daemon=True)
+    replacement['thread'].start()
+    return replacement
+
+
+# Checks whether a replacement has finished opening, whether or not it worked
+def replacement_ready(replacement):
+    return not replacement['thread'].is_alive()
+
+
+# Waits for a replacement to finish opening and gets its driver, or None if it couldn't be opened
+def wait_for_replacement(replacement):
+    replacement['thread'].join()
+    return replacement['driver']
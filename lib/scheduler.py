@@ -0,0 +1,92 @@
+# Decides how many browsers can run at once and which sites get them first, so adding sites doesn't start more Chromes
+# than the computer can handle. Sites are ordered by how stale their odds are and how many surebets they've been in
+# lately, and the pool is sized from the "pool" settings, or from the CPUs and free memory when its size is 0
+import os
+import time
+
+from . import utils
+
+psutil_installed = True
+
+try:
+    import psutil
+except ImportError:
+    psutil_installed = False
+
+# Each site's scheduling state, stored as {site: {'last_sent': ..., 'yield': ...}}
+sites = {}
+
+
+# Gets a site's scheduling state. Sites that have never been sent a job are as stale as can be
+def get_state(site):
+    return sites.setdefault(site, {'last_sent': None, 'yield': 0.0})
+
+
+# Records that a site has just been sent a job. Staleness counts from here rather than from the site's last successful
+# scrape, so a site that keeps missing its deadline can't stay first in line and hold up the rest
+def record_job(site):
+    get_state(site)['last_sent'] = time.time()
+
+
+# Records how many surebets each site was part of this cycle, keeping a moving average so one lucky cycle doesn't
+# decide the order for good. A site with the best odds for more than one outcome of a surebet only counts it once
+def record_yield(site_list, all_surebets):
+    counts = {site: 0 for site in site_list}
+    for market in all_surebets:
+        for broker_combo, surebet_df in all_surebets[market].items():
+            for broker in set(broker_combo.split('-')):
+                if broker in counts:
+                    counts[broker] += len(surebet_df)
+
+    weight = utils.get_setting('pool', 'yield_weight')
+    for site, count in counts.items():
+        state = get_state(site)
+        state['yield'] = (1 - weight) * state['yield'] + weight * count
+
+
+# Gets a site's priority. Staler odds and more surebets lately both make it higher
+def priority(site):
+    state = get_state(site)
+    if state['last_sent'] is None:
+        return float('inf')
+    return (time.time() - state['last_sent']) * (1 + state['yield'])
+
+
+# Orders sites from highest priority to lowest
+def prioritise(site_list):
+    return sorted(site_list, key=priority, reverse=True)
+
+
+# Gets how much memory is free, in MB, or None if it can't be measured
+def free_memory():
+    if psutil_installed:
+        return psutil.virtual_memory().available / 1024 ** 2
+
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+# Gets how many CPUs aren't busy, going by the load average where there is one
+def free_cpus():
+    cpus = os.cpu_count() or 1
+    try:
+        return max(cpus - os.getloadavg()[0], 0)
+    except (AttributeError, OSError):
+        return cpus
+
+
+# Gets how many browsers can run at once. A size of 0 in the settings fits as many as the free CPUs and memory allow,
+# counting the browsers already open as their CPU and memory would be used anyway. There's always room for at least one
+def pool_size(open_browsers):
+    size = utils.get_setting('pool', 'size')
+    if size > 0:
+        return size
+
+    sizes = [open_browsers + free_cpus() / utils.get_setting('pool', 'cpus_per_browser')]
+    memory = free_memory()
+    if memory is not None:
+        sizes.append(open_browsers + memory / utils.get_setting('pool', 'memory_per_browser'))
+
+    return max(int(min(sizes)), 1)
@@ -0,0 +1,172 @@
+# Shared helpers for the site scrapers
+from selenium.webdriver.support.ui import WebDriverWait
+
+from . import browser, tracing
+
+# JavaScript helper for the row scripts, finds the first element matching an XPath
+FIND_XPATH_JS = '''
+function findXPath(xpath, context) {
+    return document.evaluate(xpath, context || document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null)
+        .singleNodeValue;
+}
+'''
+
+# JavaScript helper for the row scripts, splits an element's visible text into trimmed, non-empty lines
+TEXT_LINES_JS = '''
+function textLines(element) {
+    return element.innerText.split('\\n').map(line => line.trim()).filter(line => line);
+}
+'''
+
+
+# Marks a market's current rows as stale, so wait_for_rows can tell when the next market's rows have replaced them
+MARK_STALE_SCRIPT = '''
+const box = findXPath(arguments[0]);
+if (box) {
+    box.querySelectorAll(arguments[1]).forEach(row => row.setAttribute('data-stale', ''));
+}
+'''
+
+# Waits for a market's rows to be ready, watching the page with a MutationObserver rather than sleeping. Rows are ready
+# once there's at least one that has text and isn't stale, and the page has stopped changing for a moment. Rows that
+# are updated in place rather than replaced count as ready once the change timeout passes. Gives true when the rows are
+# ready, or false if there are none by the timeout
+WAIT_FOR_ROWS_SCRIPT = '''
+const [xpath, rowSelector, timeout, changeTimeout, settle] = arguments;
+const done = arguments[arguments.length - 1];
+const start = Date.now();
+let lastChange = start;
+let readySince = null;
+
+function rows(includeStale) {
+    const box = findXPath(xpath);
+    if (!box) {
+        return [];
+    }
+    return Array.from(box.querySelectorAll(rowSelector))
+        .filter(row => (includeStale || !row.hasAttribute('data-stale')) && row.textContent.trim());
+}
+
+const observer = new MutationObserver(() => {
+    lastChange = Date.now();
+});
+observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+
+function finish(ready) {
+    observer.disconnect();
+    clearInterval(timer);
+    done(ready);
+}
+
+function check() {
+    const now = Date.now();
+    if (rows(false).length || (now - start >= changeTimeout && rows(true).length)) {
+        readySince = readySince === null ? now : readySince;
+
+        // Let the rest of the rows render, without waiting for ever on live odds updates
+        if (now - lastChange >= settle || now - readySince >= settle * 3) {
+            finish(true);
+        }
+    } else if (now - start >= timeout) {
+        finish(false);
+    }
+}
+
+const timer = setInterval(check, 50);
+check();
+'''
+
+
+# Runs a script with the JavaScript helpers available. Asynchronous scripts get a callback as their last argument
+def run_script(driver, script, *args, asynchronous=False):
+    script = FIND_XPATH_JS + TEXT_LINES_JS + script
+
+    if asynchronous:
+        return driver.execute_async_script(script, *args)
+    return driver.execute_script(script, *args)
+
+
+# Runs a row script that returns every row of a market as {'competitors': ..., 'odds': [...]}, so the whole market is
+# read in a single WebDriver round trip
+def extract_rows(driver, script, *args, asynchronous=False):
+    return run_script(driver, script, *args, asynchronous=asynchronous) or []
+
+
+# Splits extracted rows into the odds and competitor lists the sites store for each market, keeping each row's odds as
+# a list of outcomes so they only need parsing once
+def split_rows(rows):
+    odds_list = [row['odds'] for row in rows]
+    competitors = [row['competitors'] for row in rows]
+    return odds_list, competitors
+
+
+# Marks the rows matching row_selector in the element at xpath as stale. Call before changing market
+def mark_rows_stale(driver, xpath, row_selector):
+    driver.execute_script(FIND_XPATH_JS + MARK_STALE_SCRIPT, xpath, row_selector)
+
+
+# Waits for a market's rows, matching row_selector in the element at xpath, to be ready, returning as soon as they are.
+# Returns False if there were no rows by the timeout. Times are in seconds
+def wait_for_rows(driver, xpath, row_selector, timeout=5, change_timeout=1, settle=0.1):
+    return bool(driver.execute_async_script(FIND_XPATH_JS + WAIT_FOR_ROWS_SCRIPT, xpath, row_selector, timeout * 1000,
+                                            change_timeout * 1000, settle * 1000))
+
+
+# Waits for the current tab's page to finish loading, ignoring the blank page new tabs start on
+def wait_for_page(driver, timeout=10):
+    WebDriverWait(driver, timeout).until(lambda d: d.execute_script(
+        'return location.href !== "about:blank" && document.readyState === "complete"'))
+
+
+# Opens markets in groups of tabs in the same browser, yielding each market and whether it's available with the driver
+# switched to that market's tab. The first market in a group uses the current tab. The other tabs are all opened at
+# url at once, with the browser profile's resources blocked before they load, set up with prepare_tab, then have their
+# markets chosen before any market is read, so the pages load at the same time. Extra tabs are closed after each group
+def market_tabs(driver, markets, tabs, url, prepare_tab, change_market):
+    main_tab = driver.current_window_handle
+    tabs = max(1, tabs)
+
+    for start in range(0, len(markets), tabs):
+        group = markets[start:start + tabs]
+        handles = [main_tab]
+
+        # Open the extra tabs together so they load together
+        for _ in group[1:]:
+            known_handles = set(driver.window_handles)
+            driver.execute_script('window.open("about:blank", "_blank");')
+            handle = (set(driver.window_handles) - known_handles).pop()
+            handles.append(handle)
+
+            driver.switch_to.window(handle)
+            browser.block_resources(driver)
+            driver.execute_script('window.location.href = arguments[0];', url)
+            driver.pages_loaded += 1
+            driver.switch_to.window(main_tab)
+
+        try:
+            # Choose every tab's market, leaving them all to load
+            available = []
+            for handle, market in zip(handles, group):
+                driver.switch_to.window(handle)
+
+                if handle != main_tab:
+                    with tracing.span('prepare_tab', market=market):
+                        wait_for_page(driver)
+                        prepared = prepare_tab(driver)
+
+                    if not prepared:
+                        available.append(False)
+                        continue
+
+                with tracing.span('change_market', market=market):
+                    available.append(change_market(driver, market))
+
+            # Then read them one by one
+            for handle, market, is_available in zip(handles, group, available):
+                driver.switch_to.window(handle)
+                yield market, is_available
+        finally:
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(main_tab)
@@ -1,59 +1,87 @@
-import time
-import platform
-import os
-
 from selenium.webdriver import ActionChains
 from selenium.webdriver.common.keys import Keys
 
-from .. import utils
+from .. import availability, browser, odds, scraping, tracing, utils
 
-import pandas as pd
-from selenium import webdriver
-from selenium.common.exceptions import SessionNotCreatedException, StaleElementReferenceException, TimeoutException
-from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as ec
 from selenium.webdriver.support.ui import WebDriverWait
 
 SITE_LINK = 'https://www.betfair.com/sport/inplay'
 
-
-# Initialises the webdriver for use
-def initialise_webdriver():
-    # Initialise webdriver options
-    options = Options()
-    options.headless = True
-    options.add_argument('window-size=1920,1080')
-    options.add_experimental_option('excludeSwitches', ['enable-logging'])
-
-    # Path to chromedriver
-    if platform.system() == 'Windows':
-        path = 'chromedriver/chromedriver.exe'
-    elif platform.system() == 'Darwin':
-        path = 'chromedriver/chromedriver_mac'
-        os.chmod(path, 755)
-    else:
-        path = 'chromedriver/chromedriver_linux'
-        os.chmod(path, 755)
-
-    # Initialise and return webdriver
-    try:
-        driver = webdriver.Chrome(path, options=options)
-    except SessionNotCreatedException:
-        utils.pinput('Please update your version of Google Chrome. If it\'s up to date and still not working, please '
-                     'message me on GitHub.\nPress Enter to quit.')
-        utils.quit_program()
-    return driver
+# Most times to scroll the sport selector looking for a sport
+MAX_SPORT_SCROLLS = 20
+
+# The box holding the current market's events, and each event's row in it
+BOX_XPATH = '//div[contains(@class, "sport-container") and contains(@class, "visible")]'
+ROW_SELECTOR = '.com-coupon-line'
+
+# Cookie set once cookies have been accepted
+CONSENT_COOKIE = 'OptanonAlertBoxClosed'
+
+# Reads which odds format is chosen, if the setting has loaded
+ODDS_FORMAT_SCRIPT = '''
+const select = document.querySelector('select[id*="select-odds-setting"]');
+return select ? select.value : null;
+'''
+
+# Reads the odds and competitor names of every visible row in the current market
+ROWS_SCRIPT = '''
+const box = findXPath('//div[contains(@class, "sport-container") and contains(@class, "visible")]');
+if (!box) {
+    return [];
+}
+
+return Array.from(box.getElementsByClassName('com-coupon-line'))
+    .filter(row => row.offsetParent !== null)
+    .map(row => {
+        const odds = findXPath('.//div[contains(@class, "runner-list")]', row);
+        const home = row.getElementsByClassName('home-team-name')[0];
+        const away = row.getElementsByClassName('away-team-name')[0];
+        if (!odds || !home || !away) {
+            return null;
+        }
+        return {competitors: home.innerText.trim() + ' - ' + away.innerText.trim(), odds: textLines(odds)};
+    })
+    .filter(row => row);
+'''
+
+# Reads the markets in the market dropdown's options, leaving out its header. It only lists them while it's open, so
+# it's opened and closed again
+MARKETS_SCRIPT = '''
+const header = document.getElementsByClassName('com-dropdown-header')[0];
+if (!header) {
+    return [];
+}
+
+header.click();
+const options = Array.from(header.parentElement.querySelectorAll('*'))
+    .filter(element => !header.contains(element) && !element.children.length)
+    .map(element => element.textContent.trim())
+    .filter(option => option);
+header.click();
+return options;
+'''
 
 
 # Clicks the accept cookies popup
 def accept_cookies(driver):
-    time.sleep(2)
-    accept = WebDriverWait(driver, 5).until(ec.element_to_be_clickable((By.XPATH,
+    accept = WebDriverWait(driver, 7).until(ec.element_to_be_clickable((By.XPATH,
                                                                         '//*[@id="onetrust-accept-btn-handler"]')))
     driver.execute_script('arguments[0].click()', accept)
 
 
+# Checks whether cookies have already been accepted in this browser profile
+def cookies_accepted(driver):
+    return driver.get_cookie(CONSENT_COOKIE) is not None
+
+
+# Checks whether odds are already shown as decimals
+def decimal_odds_set(driver):
+    return driver.execute_script(ODDS_FORMAT_SCRIPT) == 'decimal'
+
+
 # Changes odds to decimal
 def change_to_decimal_odds(driver):
     dropdown = WebDriverWait(driver, 5).until(ec.element_to_be_clickable((By.XPATH, './/select[contains(@id,'
@@ -63,7 +91,7 @@ def change_to_decimal_odds(driver):
     # Select relevant option
     option = dropdown.find_element_by_xpath('./option[@value="decimal"]')
     option.click()
-    time.sleep(1)
+    WebDriverWait(driver, 5).until(lambda d: dropdown.get_attribute('value') == 'decimal')
 
 
 # Selects the desired sport from the row
@@ -78,7 +106,7 @@ def select_sport(driver, sport):
     # Find right arrow for if sport isn't visible
     right_arrow = sport_selector.find_element_by_class_name('arrow-right')
     tries = 0
-    while True:
+    for _ in range(MAX_SPORT_SCROLLS):
         sport_selector_buttons = WebDriverWait(sport_selector, 5).until(
             ec.visibility_of_all_elements_located((By.CLASS_NAME, 'ip-button')))
         for button in sport_selector_buttons:
@@ -100,9 +128,12 @@ def select_sport(driver, sport):
             if tries == 5:
                 return False
 
+    return False
+
 
 # Changes market dropdown
 def change_market(driver, market):
+    scraping.mark_rows_stale(driver, BOX_XPATH, ROW_SELECTOR)
     dropdown = WebDriverWait(driver, 10).until(ec.element_to_be_clickable((By.CLASS_NAME, 'com-dropdown-header')))
     dropdown.click()
     try:
@@ -116,36 +147,19 @@ def change_market(driver, market):
 
 # Gets odds for current market
 def get_market_odds(driver, market, odds_dict):
-    odds_list = []
-    competitors = []
-    time.sleep(1)
-
-    # Box containing events
-    box = driver.find_element_by_xpath('//div[contains(@class, "sport-container") and contains(@class, "visible")]')
-
-    # Get single row events
-    while True:
-        try:
-            rows = WebDriverWait(box, 5).until(ec.visibility_of_all_elements_located((By.CLASS_NAME,
-                                                                                      'com-coupon-line')))
-            break
-        except TimeoutException:
+    # Wait for the market's rows to replace the last market's
+    with tracing.span('wait_for_market', market=market):
+        if not scraping.wait_for_rows(driver, BOX_XPATH, ROW_SELECTOR):
             odds_dict[market] = {}
-            odds_dict[market]['Odds'] = odds_list
-            odds_dict[market]['Competitors'] = competitors
+            odds_dict[market]['Odds'] = []
+            odds_dict[market]['Competitors'] = []
             print(f'-- Betfair: Timed out getting odds for {market}')
             return odds_dict
 
-    # Iterate through rows and find odds and competitor names
-    for row in rows:
-        try:
-            odds = row.find_element_by_xpath('.//div[contains(@class, "runner-list")]')
-            odds_list.append(odds.text)
-            home = row.find_element_by_class_name('home-team-name').text
-            away = row.find_element_by_class_name('away-team-name').text
-            competitors.append(home + ' - ' + away)
-        except StaleElementReferenceException:
-            continue
+    # Get odds and competitor names for every row at once
+    with tracing.span('extract_rows', market=market) as attributes:
+        odds_list, competitors = scraping.split_rows(scraping.extract_rows(driver, ROWS_SCRIPT))
+        attributes['rows'] = len(competitors)
 
     # Store data in odds dictionary and return
     odds_dict[market] = {}
@@ -155,69 +169,107 @@ def get_market_odds(driver, market, odds_dict):
     return odds_dict
 
 
-# Get all odds for all specified markets
-def get_all_odds(driver, markets):
+# Reads every market in the market dropdown at once
+def read_markets(driver):
+    return scraping.run_script(driver, MARKETS_SCRIPT) or []
+
+
+# Passes a market's odds on as soon as they're scraped, if anything is listening
+def publish_market(publish, odds_dict, market):
+    if publish is not None:
+        publish(market, odds_dict[market])
+
+
+# Get all odds for all specified markets. Markets are opened in several tabs at once, as set in the site settings
+def get_all_odds(driver, sport, markets, publish=None):
     odds_dict = {}
 
     # Check that markets is not empty
-    if len(markets) > 1:
-        print('-- Betfair: Getting multi-market odds')
-        for market in markets:
-            if not change_market(driver, market):
-                print(f'-- Betfair: "{market}" market not available')
-                odds_dict[market] = {}
-                odds_dict[market]['Odds'] = []
-                odds_dict[market]['Competitors'] = []
-                continue
-            odds_dict = get_market_odds(driver, market, odds_dict)
-    elif not markets:
+    if not markets:
         print('-- Betfair: Getting match odds')
         odds_dict = get_market_odds(driver, 'win', odds_dict)
-    else:
-        print('-- Betfair: Getting single market odds')
-        if not change_market(driver, markets[0]):
-            print(f'-- Betfair: "{markets[0]}" market not available')
-        else:
-            odds_dict = get_market_odds(driver, markets[0], odds_dict)
+        publish_market(publish, odds_dict, 'win')
+        return odds_dict
+
+    # Only try the markets the site has for this sport
+    markets, missing = availability.filter_markets(driver, 'Betfair', sport, markets, read_markets)
+    for market in missing:
+        print(f'-- Betfair: "{market}" market not available')
+        odds_dict[market] = {}
+        odds_dict[market]['Odds'] = []
+        odds_dict[market]['Competitors'] = []
+
+    tabs = utils.get_site_setting('Betfair', 'market_tabs')
+    print(f'-- Betfair: Getting odds for {len(markets)} market(s) in up to {tabs} tab(s)')
+
+    # New tabs need the sport selecting again before their market can be changed
+    for market, available in scraping.market_tabs(driver, markets, tabs, SITE_LINK,
+                                                  lambda tab: select_sport(tab, sport),
+                                                  change_market):
+        if not available:
+            # The site's markets have changed, so read them again next time
+            availability.forget('Betfair', sport)
+            print(f'-- Betfair: "{market}" market not available')
+            odds_dict[market] = {}
+            odds_dict[market]['Odds'] = []
+            odds_dict[market]['Competitors'] = []
+            continue
+
+        odds_dict = get_market_odds(driver, market, odds_dict)
+        publish_market(publish, odds_dict, market)
 
     return odds_dict
 
 
-# Create dataframe from odds
+# Create typed dataframe from odds, parsing every market's odds once
 def create_df(odds_dict):
-    df_list = []
+    return odds.create_df(odds_dict)
+
+
+# Opens the site and gets it ready to scrape, accepting cookies and changing odds to decimal, which are kept in the
+# browser profile. Each is only done if it hasn't been already
+def prepare_session(driver):
+    browser.load_page(driver, SITE_LINK)
+
+    try:
+        if not cookies_accepted(driver):
+            with tracing.span('accept_cookies'):
+                accept_cookies(driver)
+    except TimeoutException:
+        pass
 
-    # Create dataframes from odds dictionary
-    for market in odds_dict:
-        df = pd.DataFrame(odds_dict[market]).set_index('Competitors')
-        df.rename(columns={'Odds': market}, inplace=True)
-        df_list.append(df)
+    try:
+        if not decimal_odds_set(driver):
+            with tracing.span('change_to_decimal_odds'):
+                change_to_decimal_odds(driver)
+    except TimeoutException:
+        print('-- Betfair: Couldn\'t change odds to decimal.')
 
-    # Concatenate dataframes and clean
-    final_df = pd.concat(df_list, axis=1, sort=True)
 
-    final_df.reset_index(inplace=True)
-    final_df.rename(columns={'index': 'Competitors'}, inplace=True)
+# Opens the site in a new webdriver, ready to be scraped
+def open_session():
+    # Initialise the webdriver
+    with tracing.span('initialise_webdriver'):
+        driver = browser.initialise_webdriver('Betfair')
 
-    final_df = final_df.fillna('').replace('SUSPENDED', '1', regex=True).replace('CLOSED', '1', regex=True) \
-        .replace('EVS', '1', regex=True)
-    final_df = final_df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
+    # Don't leave Chrome running with the profile locked if the page can't be set up, as the session is opened again
+    try:
+        prepare_session(driver)
+    except Exception:
+        driver.quit()
+        raise
 
-    return final_df
+    return driver
 
 
-# Main function
-def get_data(queue, sport, markets=None):
+# Scrapes the odds for a sport using an open session, returning the odds dictionary. If publish is given, it's called
+# with each market's odds as soon as they're scraped
+def scrape(driver, sport, markets=None, publish=None):
     if markets is None:
         markets = []
 
-    # Initialise the webdriver
-    driver = initialise_webdriver()
-
-    # Open page and accept cookies
-    driver.get(SITE_LINK)
-    accept_cookies(driver)
-    change_to_decimal_odds(driver)
+    # Reload the page so every scrape starts from the same place
+    browser.load_page(driver, SITE_LINK)
 
     # Select relevant sport from list and return availability
     sport_available = select_sport(driver, sport)
@@ -225,33 +277,11 @@ def get_data(queue, sport, markets=None):
     # If sport not available, log message and return empty dictionary
     if not sport_available:
         print(f'- Betfair: No live {sport.lower()} available right now.')
-        queue.put({})
-        return
-
-    # Get all the odds
-    try:
-        odds_dict = get_all_odds(driver, markets)
-    except TimeoutException:
-        print(f'- Betfair: Timed out, returning.')
-        queue.put({})
-        return
-
-    # Finished with the driver. It can sleep now
-    driver.quit()
+        return {}
 
-    # Set pandas options
-    pd.set_option('display.max_rows', 500)
-    pd.set_option('display.max_columns', 500)
-    pd.set_option('display.width', 1000)
+    # Get all the odds. Timeouts are left for the worker, so they count against the site's health
+    odds_dict = get_all_odds(driver, sport, markets, publish)
 
-    try:
-        # Create a dataframe from all odds data and store in dictionary to preserve name
-        final_df = create_df(odds_dict)
-        final_data = {'Betfair': final_df}
-        queue.put(final_data)
-        print('- Betfair: Returned odds')
-        return
-    except:
-        print('- Betfair: No data gathered')
-        queue.put({})
-        return
+    # Each market's odds have already been published as they were scraped
+    print('- Betfair: Returned odds' if odds_dict else '- Betfair: No data gathered')
+    return odds_dict
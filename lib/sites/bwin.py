@@ -1,46 +1,64 @@
-import time
-import platform
-import os
+from .. import availability, browser, health, odds, scraping, tracing, utils
 
-from .. import utils
-
-import pandas as pd
-from selenium import webdriver
-from selenium.common.exceptions import TimeoutException, SessionNotCreatedException, StaleElementReferenceException
-from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as ec
 from selenium.webdriver.support.ui import WebDriverWait
 
 SITE_LINK = 'https://sports.bwin.com/en/sports/live/all'
 
-
-# Initialises the webdriver for use
-def initialise_webdriver():
-    # Initialise webdriver options
-    options = Options()
-    options.headless = True
-    options.add_argument('window-size=1920,1080')
-    options.add_experimental_option('excludeSwitches', ['enable-logging'])
-
-    # Path to Chromedriver
-    if platform.system() == 'Windows':
-        path = 'chromedriver/chromedriver.exe'
-    elif platform.system() == 'Darwin':
-        path = 'chromedriver/chromedriver_mac'
-        os.chmod(path, 755)
-    else:
-        path = 'chromedriver/chromedriver_linux'
-        os.chmod(path, 755)
-
-    # Initialise and return webdriver
-    try:
-        driver = webdriver.Chrome(path, options=options)
-    except SessionNotCreatedException:
-        utils.pinput('Please update your version of Google Chrome. If it\'s up to date and still not working, please '
-                     'message me on GitHub.\nPress Enter to quit.')
-        utils.quit_program()
-    return driver
+# The grid holding the current market's events, and each event's row in it
+BOX_XPATH = '//ms-grid[contains(@sortingtracking,"Live")]'
+ROW_SELECTOR = '.grid-event'
+
+# Cookie set once cookies have been accepted
+CONSENT_COOKIE = 'OptanonAlertBoxClosed'
+
+# Reads the odds and competitor names of every row in the current market. We only want the first non-empty group of
+# odds, and for Over/Under X goals, only rows where that group is for X goals
+ROWS_SCRIPT = '''
+const market = arguments[0];
+const goals = market.includes('Over/Under') ? market.split(' ')[1] : null;
+const box = findXPath('//ms-grid[contains(@sortingtracking,"Live")]');
+if (!box) {
+    return [];
+}
+
+return Array.from(box.getElementsByClassName('grid-event'))
+    .map(row => {
+        const odd = Array.from(row.getElementsByClassName('grid-option-group'))
+            .filter(group => !group.classList.contains('empty'))[0];
+        if (!odd) {
+            return null;
+        }
+
+        let odds = textLines(odd);
+        if (goals) {
+            if (!odd.innerText.includes(goals)) {
+                return null;
+            }
+            odds = odds.map(line => line.split(goals).join('').trim()).filter(line => line);
+        }
+
+        const names = Array.from(row.getElementsByClassName('participant')).map(name => name.innerText.trim());
+        return {competitors: names.join(' - '), odds: odds};
+    })
+    .filter(row => row);
+'''
+
+# Reads the markets in the market dropdown. It only lists them while it's open, so it's opened and closed again
+MARKETS_SCRIPT = '''
+const selector = document.getElementsByTagName('ms-group-selector')[0];
+const dropdown = selector ? selector.getElementsByTagName('ms-dropdown')[0] : null;
+if (!dropdown) {
+    return [];
+}
+
+dropdown.click();
+const options = Array.from(document.querySelectorAll('.select .option')).map(option => option.textContent.trim());
+dropdown.click();
+return options;
+'''
 
 
 # Reduces change of popup
@@ -55,6 +73,11 @@ def prevent_popup(driver):
         print('-- bwin: Couldn\'t find promo banner close button.')
 
 
+# Checks whether cookies have already been accepted in this browser profile
+def cookies_accepted(driver):
+    return driver.get_cookie(CONSENT_COOKIE) is not None
+
+
 # Accepts cookies on site
 def accept_cookies(driver):
     accept = WebDriverWait(driver, 5).until(ec.element_to_be_clickable((By.XPATH,
@@ -82,7 +105,7 @@ def select_sport(driver, sport):
 # Expands listings to show all live games
 def expand_listings(driver):
     expanded_url = driver.current_url + '?fallback=false'
-    driver.get(expanded_url)
+    browser.load_page(driver, expanded_url)
 
     # Check to see if page has loaded
     for i in range(5):
@@ -96,6 +119,8 @@ def expand_listings(driver):
 
 # Changes market dropdown
 def change_market(driver, market):
+    scraping.mark_rows_stale(driver, BOX_XPATH, ROW_SELECTOR)
+
     # Get dropdown and click it
     dropdowns = WebDriverWait(driver, 5).until(ec.presence_of_all_elements_located((By.TAG_NAME, 'ms-group-selector')))
     dropdown = WebDriverWait(dropdowns[0], 10).until(ec.element_to_be_clickable((By.XPATH, './/ms-dropdown')))
@@ -116,52 +141,19 @@ def change_market(driver, market):
 
 # Gets the odds for current market
 def get_market_odds(driver, market, odds_dict):
-    odds_list = []
-    competitors = []
-    time.sleep(1)
-
-    # Box containing events
-    box = driver.find_element_by_xpath('//ms-grid[contains(@sortingtracking,"Live")]')
-
-    # Get single row events
-    rows = WebDriverWait(box, 5).until(ec.presence_of_all_elements_located((By.CLASS_NAME, 'grid-event')))
-
-    # Iterate rows and find odds and competitor names
-    for row in rows:
-        try:
-            odds = row.find_elements_by_class_name('grid-option-group')
-
-            # Remove empty odds
-            try:
-                empty_events = row.find_elements_by_class_name('empty')
-                odds = [odd for odd in odds if odd not in empty_events]
-            except Exception:
-                pass
-
-            # Return if odds is empty
-            if not odds:
-                continue
-
-            # We only want the first dropdown, so use odds[0]
-            odd = odds[0]
-
-            # If looking at Over/Under X goals, we only want odds where we have X goals
-            if 'Over/Under' in market:
-                goals = market.split(' ')[1]
-
-                if goals not in odd.text:
-                    continue
-                else:
-                    odds_list.append(odd.text.replace(goals, '').strip('\n'))
-            else:
-                odds_list.append(odd.text)
-
-            # Get competitor names
-            competitor_name_fields = row.find_elements_by_class_name('participant')
-            competitor_names = [competitor_name.text for competitor_name in competitor_name_fields]
-            competitors.append(' - '.join(competitor_names))
-        except StaleElementReferenceException:
-            continue
+    # Wait for the market's rows to replace the last market's
+    with tracing.span('wait_for_market', market=market):
+        if not scraping.wait_for_rows(driver, BOX_XPATH, ROW_SELECTOR):
+            odds_dict[market] = {}
+            odds_dict[market]['Odds'] = []
+            odds_dict[market]['Competitors'] = []
+            print(f'-- bwin: Timed out getting odds for {market}')
+            return odds_dict
+
+    # Get odds and competitor names for every row at once
+    with tracing.span('extract_rows', market=market) as attributes:
+        odds_list, competitors = scraping.split_rows(scraping.extract_rows(driver, ROWS_SCRIPT, market))
+        attributes['rows'] = len(competitors)
 
     # Store data in odds dictionary and return
     odds_dict[market] = {}
@@ -171,79 +163,118 @@ def get_market_odds(driver, market, odds_dict):
     return odds_dict
 
 
-# Get all odds for all specified markets
-def get_all_odds(driver, markets):
+# Reads every market in the market dropdown at once
+def read_markets(driver):
+    return scraping.run_script(driver, MARKETS_SCRIPT) or []
+
+
+# Passes a market's odds on as soon as they're scraped, if anything is listening
+def publish_market(publish, odds_dict, market):
+    if publish is not None:
+        publish(market, odds_dict[market])
+
+
+# bwin doesn't have separate markets for Over/Under X Goals, so deal with it this way
+def dropdown_market(market):
+    if 'Over/Under' in market:
+        return 'Over/Under'
+    return market
+
+
+# Get all odds for all specified markets. Markets are opened in several tabs at once, as set in the site settings
+def get_all_odds(driver, sport, markets, publish=None):
     odds_dict = {}
 
     # Check that markets is not empty
-    if len(markets) > 1:
-        print('-- bwin: Getting multi-market odds')
-        for market in markets:
-            # bwin doesn't have separate markets for Over/Under X Goals, so deal with it this way
-            if 'Over/Under' in market:
-                market_to_change = 'Over/Under'
-            else:
-                market_to_change = market
-
-            if not change_market(driver, market_to_change):
-                print(f'-- bwin: "{market}" market not available')
-                odds_dict[market] = {}
-                odds_dict[market]['Odds'] = []
-                odds_dict[market]['Competitors'] = []
-                continue
-            odds_dict = get_market_odds(driver, market, odds_dict)
-    elif not markets:
+    if not markets:
         print('-- bwin: Getting match odds')
         odds_dict = get_market_odds(driver, 'win', odds_dict)
-    else:
-        print('-- bwin: Getting single market odds')
-        if not change_market(driver, markets[0]):
-            print(f'-- bwin: "{markets[0]}" market not available')
-        else:
-            odds_dict = get_market_odds(driver, markets[0], odds_dict)
+        publish_market(publish, odds_dict, 'win')
+        return odds_dict
+
+    # Only try the markets the site has for this sport
+    markets, missing = availability.filter_markets(driver, 'bwin', sport, markets, read_markets, dropdown_market)
+    for market in missing:
+        print(f'-- bwin: "{market}" market not available')
+        odds_dict[market] = {}
+        odds_dict[market]['Odds'] = []
+        odds_dict[market]['Competitors'] = []
+
+    tabs = utils.get_site_setting('bwin', 'market_tabs')
+    print(f'-- bwin: Getting odds for {len(markets)} market(s) in up to {tabs} tab(s)')
+
+    # New tabs need the sport selecting again before their market can be changed. The dropdown is rebuilt while the page
+    # loads, so changing market is tried again if it goes stale
+    for market, available in scraping.market_tabs(
+            driver, markets, tabs, SITE_LINK, lambda tab: select_sport(tab, sport),
+            lambda tab, tab_market: health.retry(change_market, tab, dropdown_market(tab_market),
+                                                 exceptions=(StaleElementReferenceException,))):
+        if not available:
+            # The site's markets have changed, so read them again next time
+            availability.forget('bwin', sport)
+            print(f'-- bwin: "{market}" market not available')
+            odds_dict[market] = {}
+            odds_dict[market]['Odds'] = []
+            odds_dict[market]['Competitors'] = []
+            continue
+
+        odds_dict = get_market_odds(driver, market, odds_dict)
+        publish_market(publish, odds_dict, market)
 
     return odds_dict
 
 
-# Create dataframe from odds
+# Create typed dataframe from odds, parsing every market's odds once
 def create_df(odds_dict):
-    df_list = []
+    return odds.create_df(odds_dict)
+
+
+# Opens the site and gets it ready to scrape, preventing the popup and accepting cookies if it appears, which are kept
+# in the browser profile. A profile that's already accepted cookies has closed the popup before, so it's only closed
+# again if it's showing
+def prepare_session(driver):
+    browser.load_page(driver, SITE_LINK)
+    accepted = cookies_accepted(driver)
 
-    # Create dataframes from odds dictionary
-    for market in odds_dict:
-        df = pd.DataFrame(odds_dict[market]).set_index('Competitors')
-        df.rename(columns={'Odds': market}, inplace=True)
-        df_list.append(df)
+    try:
+        if not accepted or driver.find_elements_by_class_name('header-top-promo-banner'):
+            with tracing.span('prevent_popup'):
+                prevent_popup(driver)
+    except TimeoutException:
+        pass
 
-    # Concatenate dataframes and clean
-    final_df = pd.concat(df_list, axis=1, sort=True)
+    try:
+        if not accepted:
+            with tracing.span('accept_cookies'):
+                accept_cookies(driver)
+    except TimeoutException:
+        pass
 
-    final_df.reset_index(inplace=True)
-    final_df.rename(columns={'index': 'Competitors'}, inplace=True)
 
-    final_df = final_df.fillna('').replace('SUSPENDED', '1', regex=True).replace('CLOSED', '1', regex=True) \
-        .replace('EVS', '1', regex=True)
-    final_df = final_df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
+# Opens the site in a new webdriver, ready to be scraped
+def open_session():
+    # Initialise the webdriver
+    with tracing.span('initialise_webdriver'):
+        driver = browser.initialise_webdriver('bwin')
 
-    return final_df
+    # Don't leave Chrome running with the profile locked if the page can't be set up, as the session is opened again
+    try:
+        prepare_session(driver)
+    except Exception:
+        driver.quit()
+        raise
 
+    return driver
 
-# Main function
-def get_data(queue, sport, markets=None):
+
+# Scrapes the odds for a sport using an open session, returning the odds dictionary. If publish is given, it's called
+# with each market's odds as soon as they're scraped
+def scrape(driver, sport, markets=None, publish=None):
     if markets is None:
         markets = []
 
-    # Initialise the webdriver
-    driver = initialise_webdriver()
-
-    # Open page, prevent popup and accept cookies if it appears
-    driver.get(SITE_LINK)
-    prevent_popup(driver)
-
-    try:
-        accept_cookies(driver)
-    except TimeoutException:
-        pass
+    # Reload the page so every scrape starts from the same place
+    browser.load_page(driver, SITE_LINK)
 
     # Select relevant sport from list and return availability
     sport_available = select_sport(driver, sport)
@@ -251,33 +282,11 @@ def get_data(queue, sport, markets=None):
     # If sport not available, log message and return empty dictionary
     if not sport_available:
         print(f'- bwin: No live {sport.lower()} available right now.')
-        queue.put({})
-        return
+        return {}
 
-    # Get all the odds
-    try:
-        odds_dict = get_all_odds(driver, markets)
-    except TimeoutException:
-        print(f'- bwin: Timed out, returning.')
-        queue.put({})
-        return
-
-    # Finished with the driver. It can sleep now
-    driver.quit()
-
-    # Set pandas options
-    pd.set_option('display.max_rows', 500)
-    pd.set_option('display.max_columns', 500)
-    pd.set_option('display.width', 1000)
+    # Get all the odds. Timeouts are left for the worker, so they count against the site's health
+    odds_dict = get_all_odds(driver, sport, markets, publish)
 
-    try:
-        # Create a dataframe from all odds data and store in dictionary to preserve name
-        final_df = create_df(odds_dict)
-        final_data = {'bwin': final_df}
-        queue.put(final_data)
-        print('- bwin: Returned odds')
-        return
-    except:
-        print('- bwin: No data gathered')
-        queue.put({})
-        return
+    # Each market's odds have already been published as they were scraped
+    print('- bwin: Returned odds' if odds_dict else '- bwin: No data gathered')
+    return odds_dict
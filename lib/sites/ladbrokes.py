@@ -1,45 +1,75 @@
-import time
-import platform
-import os
-from .. import utils
-
-import pandas as pd
-from selenium import webdriver
-from selenium.common.exceptions import TimeoutException, StaleElementReferenceException, SessionNotCreatedException
-from selenium.webdriver.chrome.options import Options
+from .. import availability, browser, health, odds, scraping, tracing, utils
+
+from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as ec
 from selenium.webdriver.support.ui import WebDriverWait
 
 SITE_LINK = 'https://sports.ladbrokes.com/in-play/football'
 
-
-# Initialises the webdriver for use
-def initialise_webdriver():
-    # Initialise webdriver options
-    options = Options()
-    options.headless = True
-    options.add_argument('window-size=1920,1080')
-    options.add_experimental_option('excludeSwitches', ['enable-logging'])
-
-    # Path to chromedriver
-    if platform.system() == 'Windows':
-        path = 'chromedriver/chromedriver.exe'
-    elif platform.system() == 'Darwin':
-        path = 'chromedriver/chromedriver_mac'
-        os.chmod(path, 755)
-    else:
-        path = 'chromedriver/chromedriver_linux'
-        os.chmod(path, 755)
-
-    # Initialise and return webdriver
-    try:
-        driver = webdriver.Chrome(path, options=options)
-    except SessionNotCreatedException:
-        utils.pinput('Please update your version of Google Chrome. If it\'s up to date and still not working, please '
-                     'message me on GitHub.\nPress Enter to quit.')
-        utils.quit_program()
-    return driver
+# The list holding the current market's listings, and each listing's header in it
+BOX_XPATH = '//*[contains(@data-crlat, "accordionsList")]'
+ROW_SELECTOR = '.accordion-header'
+
+# Expands every listing that isn't already open to show all live games, waits for the rows to stop changing, then
+# reads the odds and competitor names of every row
+ROWS_SCRIPT = '''
+const done = arguments[arguments.length - 1];
+
+const listings = document.evaluate('//accordion[position()>2]/header', document, null,
+                                   XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+for (let i = 0; i < listings.snapshotLength; i++) {
+    listings.snapshotItem(i).click();
+}
+
+function readRows() {
+    const section = findXPath('//*[contains(@data-crlat, "accordionsList")]');
+    const box = section ? section.getElementsByTagName('div')[0] : null;
+    if (!box) {
+        return [];
+    }
+
+    return Array.from(box.getElementsByClassName('sport-card'))
+        .map(row => {
+            const odds = row.getElementsByClassName('sport-card-btn-content')[0];
+            const names = row.getElementsByClassName('sport-card-names')[0];
+            if (!odds || !names) {
+                return null;
+            }
+            return {competitors: textLines(names).join(' - '), odds: textLines(odds)};
+        })
+        .filter(row => row);
+}
+
+// Opened listings fill in over the next few frames, so wait until the row count settles
+let lastCount = -1;
+let stableChecks = 0;
+let waited = 0;
+(function poll() {
+    const rows = readRows();
+    stableChecks = rows.length === lastCount ? stableChecks + 1 : 0;
+    lastCount = rows.length;
+
+    if (stableChecks >= 2 || waited >= 3000) {
+        done(rows);
+        return;
+    }
+
+    waited += 100;
+    setTimeout(poll, 100);
+})();
+'''
+
+# Reads the markets in the market dropdown
+MARKETS_SCRIPT = '''
+return Array.from(document.querySelectorAll('[data-crlat*="dropdown.menuTitle"]')).map(item => item.innerHTML.trim());
+'''
+
+
+# Checks whether cookies have already been accepted in this browser profile, and the message isn't showing again
+def cookies_accepted(driver):
+    return browser.setup_done(driver, 'accept_cookies') and not driver.find_elements_by_class_name(
+        'cookie-consent-message')
 
 
 # Accepts cookies on site
@@ -75,19 +105,6 @@ def select_sport(driver, sport):
     return False
 
 
-# Expand listing to show all live games
-def expand_listings(driver):
-    # Get all listings that aren't expanded
-    WebDriverWait(driver, 5).until(ec.visibility_of_any_elements_located((By.CLASS_NAME, 'accordion-header')))
-    listings = driver.find_elements_by_xpath('//accordion[position()>2]/header')
-
-    # Iterate through listings and open them
-    for listing in listings:
-        driver.execute_script('arguments[0].click();', listing)
-        # Only uncomment this if you get errors
-        # time.sleep(0.5)
-
-
 # Changes market dropdown
 def change_market(driver, market):
     dropdown_list = WebDriverWait(driver, 5).until(ec.presence_of_element_located((By.CLASS_NAME, 'dropdown-menu')))
@@ -95,17 +112,8 @@ def change_market(driver, market):
 
     for item in dropdown_items:
         if item.get_attribute("innerHTML") == market:
+            scraping.mark_rows_stale(driver, BOX_XPATH, ROW_SELECTOR)
             driver.execute_script('arguments[0].click();', item)
-            time.sleep(1)
-
-            # Expand listings
-            while True:
-                try:
-                    expand_listings(driver)
-                    break
-                except StaleElementReferenceException:
-                    pass
-
             return True
 
     return False
@@ -113,27 +121,19 @@ def change_market(driver, market):
 
 # Gets odds for current market
 def get_market_odds(driver, market, odds_dict):
-    odds_list = []
-    competitors = []
-    time.sleep(1)
-
-    # Box containing events
-    section = WebDriverWait(driver, 5).until(ec.presence_of_element_located((By.XPATH, '//*[contains(@data-crlat, '
-                                                                                       '"accordionsList")]')))
-    box = section.find_element_by_tag_name('div')
-
-    # Get single row events
-    rows = box.find_elements_by_class_name('sport-card')
-
-    # Iterate through rows and find odds and competitor names
-    for row in rows:
-        try:
-            odds = row.find_element_by_class_name('sport-card-btn-content')
-            competitor_names = row.find_element_by_class_name('sport-card-names').text
-            odds_list.append(odds.text)
-            competitors.append(competitor_names.replace('\n', ' - '))
-        except StaleElementReferenceException:
-            continue
+    # Wait for the market's listings to replace the last market's
+    with tracing.span('wait_for_market', market=market):
+        if not scraping.wait_for_rows(driver, BOX_XPATH, ROW_SELECTOR):
+            odds_dict[market] = {}
+            odds_dict[market]['Odds'] = []
+            odds_dict[market]['Competitors'] = []
+            print(f'-- Ladbrokes: Timed out getting odds for {market}')
+            return odds_dict
+
+    # Expand listings and get odds and competitor names for every row at once
+    with tracing.span('extract_rows', market=market) as attributes:
+        odds_list, competitors = scraping.split_rows(scraping.extract_rows(driver, ROWS_SCRIPT, asynchronous=True))
+        attributes['rows'] = len(competitors)
 
     # Store data in odds dictionary and return
     odds_dict[market] = {}
@@ -143,71 +143,103 @@ def get_market_odds(driver, market, odds_dict):
     return odds_dict
 
 
-def get_all_odds(driver, markets):
+# Reads every market in the market dropdown at once
+def read_markets(driver):
+    return scraping.run_script(driver, MARKETS_SCRIPT) or []
+
+
+# Passes a market's odds on as soon as they're scraped, if anything is listening
+def publish_market(publish, odds_dict, market):
+    if publish is not None:
+        publish(market, odds_dict[market])
+
+
+# Get all odds for all specified markets. Markets are opened in several tabs at once, as set in the site settings
+def get_all_odds(driver, sport, markets, publish=None):
     odds_dict = {}
 
     # Check that markets is not empty
-    if len(markets) > 1:
-        print('-- Ladbrokes: Getting multi-market odds')
-        for market in markets:
-            if not change_market(driver, market):
-                print(f'-- Ladbrokes: "{market}" market not available')
-                odds_dict[market] = {}
-                odds_dict[market]['Odds'] = []
-                odds_dict[market]['Competitors'] = []
-                continue
-            get_market_odds(driver, market, odds_dict)
-    elif not markets:
+    if not markets:
         print('-- Ladbrokes: Getting match odds')
         odds_dict = get_market_odds(driver, 'win', odds_dict)
-    else:
-        print('-- Ladbrokes: Getting single market odds')
-        if not change_market(driver, markets[0]):
-            print(f'-- Ladbrokes: "{markets[0]}" market not available')
-        else:
-            odds_dict = get_market_odds(driver, markets[0], odds_dict)
+        publish_market(publish, odds_dict, 'win')
+        return odds_dict
+
+    # Only try the markets the site has for this sport
+    markets, missing = availability.filter_markets(driver, 'Ladbrokes', sport, markets, read_markets)
+    for market in missing:
+        print(f'-- Ladbrokes: "{market}" market not available')
+        odds_dict[market] = {}
+        odds_dict[market]['Odds'] = []
+        odds_dict[market]['Competitors'] = []
+
+    tabs = utils.get_site_setting('Ladbrokes', 'market_tabs')
+    print(f'-- Ladbrokes: Getting odds for {len(markets)} market(s) in up to {tabs} tab(s)')
+
+    # New tabs need the sport selecting again before their market can be changed. The dropdown is rebuilt while the page
+    # loads, so changing market is tried again if it goes stale
+    for market, available in scraping.market_tabs(
+            driver, markets, tabs, SITE_LINK, lambda tab: select_sport(tab, sport),
+            lambda tab, tab_market: health.retry(change_market, tab, tab_market,
+                                                 exceptions=(StaleElementReferenceException,))):
+        if not available:
+            # The site's markets have changed, so read them again next time
+            availability.forget('Ladbrokes', sport)
+            print(f'-- Ladbrokes: "{market}" market not available')
+            odds_dict[market] = {}
+            odds_dict[market]['Odds'] = []
+            odds_dict[market]['Competitors'] = []
+            continue
+
+        odds_dict = get_market_odds(driver, market, odds_dict)
+        publish_market(publish, odds_dict, market)
 
     return odds_dict
 
 
-# Create dataframe from odds
+# Create typed dataframe from odds, parsing every market's odds once
 def create_df(odds_dict):
-    df_list = []
+    return odds.create_df(odds_dict)
 
-    # Create dataframes from odds dictionary
-    for market in odds_dict:
-        df = pd.DataFrame(odds_dict[market]).set_index('Competitors')
-        df.rename(columns={'Odds': market}, inplace=True)
-        df_list.append(df)
 
-    # Concatenate dataframes and clean
-    final_df = pd.concat(df_list, axis=1, sort=True)
+# Opens the site and gets it ready to scrape, accepting cookies, which are kept in the browser profile, unless they've
+# been accepted already
+def prepare_session(driver):
+    browser.load_page(driver, SITE_LINK)
 
-    final_df.reset_index(inplace=True)
-    final_df.rename(columns={'index': 'Competitors'}, inplace=True)
+    try:
+        if not cookies_accepted(driver):
+            with tracing.span('accept_cookies'):
+                accept_cookies(driver)
+            browser.mark_setup_done(driver, 'accept_cookies')
+    except TimeoutException:
+        pass
 
-    final_df = final_df.fillna('').replace('SUSP', '1', regex=True).replace('CLOSED', '1', regex=True) \
-        .replace('EVS', '1', regex=True)
-    final_df = final_df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
 
-    return final_df
+# Opens the site in a new webdriver, ready to be scraped
+def open_session():
+    # Initialise the webdriver
+    with tracing.span('initialise_webdriver'):
+        driver = browser.initialise_webdriver('Ladbrokes')
 
+    # Don't leave Chrome running with the profile locked if the page can't be set up, as the session is opened again
+    try:
+        prepare_session(driver)
+    except Exception:
+        driver.quit()
+        raise
 
-# Main function
-def get_data(queue, sport, markets=None):
-    if markets is None:
-        markets = []
+    return driver
 
-    # Initialise the webdriver
-    driver = initialise_webdriver()
 
-    # Open page and accept cookies
-    driver.get(SITE_LINK)
+# Scrapes the odds for a sport using an open session, returning the odds dictionary. If publish is given, it's called
+# with each market's odds as soon as they're scraped
+def scrape(driver, sport, markets=None, publish=None):
+    if markets is None:
+        markets = []
 
-    try:
-        accept_cookies(driver)
-    except TimeoutException:
-        pass
+    # Reload the page so every scrape starts from the same place
+    browser.load_page(driver, SITE_LINK)
 
     # Select relevant sport from list and return availability
     sport_available = select_sport(driver, sport)
@@ -215,33 +247,11 @@ def get_data(queue, sport, markets=None):
     # If sport not available, log message and return empty dictionary
     if not sport_available:
         print(f'- Ladbrokes: No live {sport.lower()} available right now.')
-        queue.put({})
-        return
+        return {}
 
-    # Get all the odds
-    try:
-        odds_dict = get_all_odds(driver, markets)
-    except TimeoutException:
-        print(f'- Ladbrokes: Timed out, returning.')
-        queue.put({})
-        return
+    # Get all the odds. Timeouts are left for the worker, so they count against the site's health
+    odds_dict = get_all_odds(driver, sport, markets, publish)
 
-    # Finished with the driver. It can sleep now
-    driver.quit()
-
-    # Set pandas options
-    pd.set_option('display.max_rows', 500)
-    pd.set_option('display.max_columns', 500)
-    pd.set_option('display.width', 1000)
-
-    try:
-        # Create a dataframe from all odds data and store in dictionary to preserve name
-        final_df = create_df(odds_dict)
-        final_data = {'Ladbrokes': final_df}
-        queue.put(final_data)
-        print('- Ladbrokes: Returned odds')
-        return
-    except:
-        print('- Ladbrokes: No data gathered')
-        queue.put({})
-        return
+    # Each market's odds have already been published as they were scraped
+    print('- Ladbrokes: Returned odds' if odds_dict else '- Ladbrokes: No data gathered')
+    return odds_dict
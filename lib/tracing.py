@@ -0,0 +1,98 @@
+import cProfile
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from . import utils
+
+# Tracing settings, loaded once per process by configure
+config = {'enabled': False, 'directory': 'files/traces', 'profile': None}
+
+# Attributes added to every span in this process, e.g. the broker a site worker scrapes
+context = {}
+
+# Spans finished in this process since they were last taken
+spans = []
+
+
+# Loads the tracing settings. Called once in the main process and once in every site worker
+def configure():
+    config.update(utils.load_settings().get('tracing', {}))
+    return config
+
+
+# Sets attributes to add to every span in this process
+def set_context(**attributes):
+    context.update(attributes)
+
+
+# Saves a cProfile dump for a stage to the traces directory
+def save_profile(profiler, name):
+    os.makedirs(config['directory'], exist_ok=True)
+    profiler.dump_stats(os.path.join(config['directory'], f'{name}-{os.getpid()}-{int(time.time() * 1000)}.prof'))
+
+
+# Times a stage of the program. Yields the span's attributes so things only known at the end, like row counts, can be
+# added. If the stage's name is the one set as "profile" in the tracing settings, it's also run under cProfile. Does
+# nothing if tracing isn't turned on
+@contextmanager
+def span(name, **attributes):
+    if not config['enabled']:
+        yield attributes
+        return
+
+    attributes = {**context, **attributes}
+    profiler = cProfile.Profile() if config['profile'] == name else None
+
+    start = time.time()
+    counter = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+
+    try:
+        yield attributes
+    except BaseException as e:
+        attributes['error'] = e.__class__.__name__
+        raise
+    finally:
+        duration = time.perf_counter() - counter
+        if profiler is not None:
+            profiler.disable()
+            save_profile(profiler, name)
+
+        spans.append({'name': name, 'start': start, 'duration': duration, 'pid': os.getpid(),
+                      'attributes': attributes})
+
+
+# Takes all the spans finished in this process so far, e.g. to send them from a worker to the main process
+def take_spans():
+    taken = spans[:]
+    spans.clear()
+    return taken
+
+
+# Adds spans from another process
+def add_spans(new_spans):
+    spans.extend(new_spans)
+
+
+# Saves all the spans for a cycle as a trace in the Chrome trace event format, which can be opened in chrome://tracing
+# or Perfetto, then clears them ready for the next cycle. Returns the path
+def save_trace():
+    cycle_spans = sorted(take_spans(), key=lambda cycle_span: cycle_span['start'])
+    if not config['enabled'] or not cycle_spans:
+        return None
+
+    trace_events = [{'name': cycle_span['name'], 'ph': 'X', 'ts': cycle_span['start'] * 1e6,
+                     'dur': cycle_span['duration'] * 1e6, 'pid': cycle_span['pid'],
+                     'tid': cycle_span['pid'], 'args': cycle_span['attributes']} for cycle_span in cycle_spans]
+
+    os.makedirs(config['directory'], exist_ok=True)
+    file_name = time.strftime('trace-%Y%m%d-%H%M%S', time.localtime(cycle_spans[0]['start'])) + '.json'
+    path = os.path.join(config['directory'], file_name)
+
+    with open(path, 'w') as trace_file:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, trace_file, default=str)
+
+    return path
@@ -0,0 +1,128 @@
+# Sends site workers' dataframes to the main process through shared memory, so only a small handle goes through the
+# results queue rather than the whole pickled dataframe. The odds are mapped straight from shared memory in the main
+# process without copying
+import os
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+# Separates strings in the shared memory block
+STRING_SEPARATOR = '\x1f'
+
+# Windows frees a shared memory block as soon as its last handle is closed, which is before the main process has opened
+# it, so dataframes are only shared this way on POSIX systems and are pickled onto the results queue everywhere else
+SHARED_MEMORY_SUPPORTED = os.name == 'posix'
+
+# Shared memory blocks the main process has opened this cycle, by name
+opened = {}
+
+# Blocks that have been removed but were still in use, so couldn't be closed yet
+unclosed = []
+
+
+# Creates a shared memory block that the main process will own, so this process doesn't remove it when it exits
+def create_block(size):
+    try:
+        return shared_memory.SharedMemory(create=True, size=size, track=False)
+    except TypeError:
+        block = shared_memory.SharedMemory(create=True, size=size)
+        resource_tracker.unregister(block._name, 'shared_memory')
+        return block
+
+
+# Checks whether a column is stored with a plain NumPy dtype of one of the given kinds, e.g. 'f' for floats
+def is_kind(column, kinds):
+    return isinstance(column.dtype, np.dtype) and column.dtype.kind in kinds
+
+
+# Writes a dataframe into a shared memory block, returning the handle to send in its place. Float columns, like odds,
+# are stored together as float64 so they can be mapped as one block, followed by integer and bool columns, like outcome
+# counts, as int64, then every other column as strings. Each numeric column's dtype is sent along so it can be restored
+def share_df(df):
+    float_columns = [column for column in df.columns if is_kind(df[column], 'f')]
+    int_columns = [column for column in df.columns if is_kind(df[column], 'iub')]
+    string_columns = [column for column in df.columns if column not in float_columns + int_columns]
+    dtypes = {column: df[column].dtype.str for column in float_columns + int_columns}
+
+    rows = len(df)
+    floats = df[float_columns].to_numpy(dtype=np.float64)
+    ints = df[int_columns].to_numpy(dtype=np.int64)
+    strings = STRING_SEPARATOR.join(str(value) for column in string_columns for value in df[column]).encode()
+
+    block = create_block(max(floats.nbytes + ints.nbytes + len(strings), 1))
+    np.ndarray(floats.shape, dtype=np.float64, buffer=block.buf)[:] = floats
+    np.ndarray(ints.shape, dtype=np.int64, buffer=block.buf, offset=floats.nbytes)[:] = ints
+    block.buf[floats.nbytes + ints.nbytes:floats.nbytes + ints.nbytes + len(strings)] = strings
+    block.close()
+
+    return {'name': block.name, 'rows': rows, 'float_columns': float_columns, 'int_columns': int_columns,
+            'string_columns': string_columns, 'string_bytes': len(strings), 'dtypes': dtypes}
+
+
+# Maps a shared dataframe from its handle. Float64 columns are a view of the shared memory, so aren't copied, and other
+# numeric columns are converted back to their own dtype. The block stays open until release_all is called
+def load_df(handle):
+    block = shared_memory.SharedMemory(name=handle['name'])
+    opened[handle['name']] = block
+
+    rows = handle['rows']
+    float_columns, int_columns = handle['float_columns'], handle['int_columns']
+    floats = np.ndarray((rows, len(float_columns)), dtype=np.float64, buffer=block.buf)
+    ints = np.ndarray((rows, len(int_columns)), dtype=np.int64, buffer=block.buf, offset=floats.nbytes)
+
+    string_start = floats.nbytes + ints.nbytes
+    strings = bytes(block.buf[string_start:string_start + handle['string_bytes']]).decode()
+    strings = strings.split(STRING_SEPARATOR) if handle['string_columns'] and rows else []
+
+    df = pd.DataFrame(floats, columns=float_columns, copy=False)
+    for i, column in enumerate(handle['string_columns']):
+        df.insert(i, column, np.array(strings[i * rows:(i + 1) * rows], dtype=object))
+    for i, column in enumerate(int_columns):
+        df[column] = ints[:, i].astype(handle['dtypes'][column], copy=False)
+    for column in float_columns:
+        if handle['dtypes'][column] != floats.dtype.str:
+            df[column] = df[column].astype(handle['dtypes'][column])
+
+    return df
+
+
+# Gets the dataframe from a market message, however it was sent
+def receive_df(message):
+    if 'shared' in message:
+        return load_df(message['shared'])
+    return message['df']
+
+
+# Frees the shared memory for a message that won't be used, e.g. one that arrived too late
+def discard(message):
+    if 'shared' not in message:
+        return
+
+    try:
+        block = shared_memory.SharedMemory(name=message['shared']['name'])
+    except FileNotFoundError:
+        return
+
+    block.close()
+    block.unlink()
+
+
+# Closes a block, keeping hold of it to try again later if a dataframe is still using it
+def close_block(block):
+    try:
+        block.close()
+    except BufferError:
+        unclosed.append(block)
+
+
+# Frees all the shared memory opened this cycle. The memory of blocks still used by a dataframe is freed once it's gone
+def release_all():
+    for block in unclosed[:]:
+        unclosed.remove(block)
+        close_block(block)
+
+    for name in list(opened):
+        block = opened.pop(name)
+        block.unlink()
+        close_block(block)
@@ -28,16 +28,7 @@ def get_sport():
             continue
 
         # Get markets for sport
-        two_way_markets = sports_and_markets[chosen_sport]['two-way']
-        three_way_markets = sports_and_markets[chosen_sport]['three-way']
-
-        # Variable containing all markets
-        markets = two_way_markets + three_way_markets
-
-        # Boolean for whether match result is a three way bet, and if it is, append to three way markets
-        win_is_three_way = sports_and_markets[chosen_sport]['win-bet-is-three-way']
-        if win_is_three_way:
-            three_way_markets.append('win')
+        markets, three_way_markets = utils.get_markets(chosen_sport)
 
         # Return values
         return chosen_sport, markets, three_way_markets
@@ -92,10 +83,8 @@ def get_wait_time():
     return wait_time * 60
 
 
-# Presents surebets nicely to user
-def present_surebets(all_surebets, sport):
-    utils.clear()
-
+# Creates a string showing the surebets for every market, which is empty if there aren't any
+def surebets_string(all_surebets):
     # List to store generated strings for all markets
     surebet_market_strings = []
 
@@ -143,8 +132,16 @@ def present_surebets(all_surebets, sport):
         market_string = f'{market_formatted}:\n' + '\n'.join(surebet_pair_strings)
         surebet_market_strings.append(market_string)
 
+    return '\n\n'.join(surebet_market_strings)
+
+
+# Presents surebets nicely to user
+def present_surebets(all_surebets, sport):
+    utils.clear()
+    surebets = surebets_string(all_surebets)
+
     # If everything is empty, just return out
-    if not surebet_market_strings:
+    if not surebets:
         return
 
     # Get current time to print
@@ -152,10 +149,22 @@ def present_surebets(all_surebets, sport):
     current_time = now.strftime('%H:%M')
 
     # Join all strings
-    final_string = f'SUREBETS FOUND!\n{sport} - {current_time}\n\n' + '\n\n'.join(surebet_market_strings) + \
+    final_string = f'SUREBETS FOUND!\n{sport} - {current_time}\n\n' + surebets + \
                    '\n\nPress {YELLOW}Enter{RESET} to continue.'
 
     # Present to user
     utils.pprint(final_string)
     beepy.beep(sound='success')
     input(': ')
+
+
+# Alerts the user to surebets found while sites are still being scraped, without waiting for them
+def alert_surebets(all_surebets, sport):
+    surebets = surebets_string(all_surebets)
+
+    if not surebets:
+        return
+
+    current_time = datetime.now().strftime('%H:%M:%S')
+    utils.pprint(f'{{GREEN}}NEW SUREBETS!{{RESET}}\n{sport} - {current_time}\n\n' + surebets)
+    beepy.beep(sound='success')
@@ -2,7 +2,8 @@
 import json
 import os
 import sys
-import re
+
+import numpy as np
 
 colours_installed = True
 
@@ -19,39 +20,59 @@ else:
 LINE = "------------------------------------------------------------------------------------------------------------" \
        "-------"
 
+# The program settings, once they've been loaded. See load_settings
+settings = None
+
 
-# Rounds a number to the nearest whole value multiple of 'base'
+# Rounds a number, or an array of numbers, to the nearest whole value multiple of 'base'
 def round_to(x, base=5):
-    return base * round(x / base)
+    return base * np.round(np.asarray(x, dtype=float) / base)
 
 
-# Damned Europeans...
-def replace_comma(x):
-    if isinstance(x, str):
-        x = re.sub(r'\d,\d', '1', x)
-    return x
+# Clears the terminal
+def clear():
+    os.system('cls' if os.name == 'nt' else 'clear')
 
 
-# Converts fractional odds to floats, bearing in mind float odds show full return, whereas fractional odds ignore
-# initial stake
-def convert_odds(x):
-    if isinstance(x, str) and '/' in x:
-        numerator = float(x.split('/')[0])
-        denominator = float(x.split('/')[1])
-        x = float(numerator / denominator + 1)
-    return float(x)
+# Loads the program settings. They're only read from the file the first time, or when reload is set, which the main
+# program does at the start of every cycle and workers do with every job, so changes are still picked up between cycles
+def load_settings(reload=False):
+    global settings
 
+    if settings is None or reload:
+        with open('files/settings.json') as settings_file:
+            settings = json.load(settings_file)
 
-# Checks length of odds
-def check_length(x, num):
-    if len(x.split('\n')) != num:
-        x = ('1\n' * num).strip('\n')
-    return x
+    return settings
 
 
-# Clears the terminal
-def clear():
-    os.system('cls' if os.name == 'nt' else 'clear')
+# Gets a setting from a section of the settings
+def get_setting(section, key):
+    return load_settings()[section][key]
+
+
+# Gets a setting for a site, falling back to the default for all sites
+def get_site_setting(site, key):
+    site_settings = load_settings()['sites']
+    return site_settings.get(site, {}).get(key, site_settings['default'][key])
+
+
+# Gets all markets for a sport, along with which of them are three way
+def get_markets(sport):
+    with open('files/sports_and_markets.json') as sports_and_markets_file:
+        sports_and_markets = json.load(sports_and_markets_file)
+
+    two_way_markets = sports_and_markets[sport]['two-way']
+    three_way_markets = sports_and_markets[sport]['three-way']
+
+    # Variable containing all markets
+    markets = two_way_markets + three_way_markets
+
+    # Boolean for whether match result is a three way bet, and if it is, append to three way markets
+    if sports_and_markets[sport]['win-bet-is-three-way']:
+        three_way_markets.append('win')
+
+    return markets, three_way_markets
 
 
 # Translates standard market names to individual site market names
@@ -72,12 +93,13 @@ def translate_to_standard_market(market, broker):
     translations = {translations[broker][key]: key for key in translations[broker]}
 
     try:
-        return translations[broker][market]
+        return translations[market]
     except KeyError:
         return market
 
 
-# Translates column names to standard market names for program
+# Translates column names to standard market names for program. Each market has several columns, named after the
+# market, so the market name at the start of each one is translated
 def translate_columns(df, broker):
     with open('files/market_translations.json') as market_translations:
         translations = json.load(market_translations)
@@ -85,7 +107,14 @@ def translate_columns(df, broker):
     # Have to reverse dictionary for pandas rename
     broker_translations = {translations[broker][key]: key for key in translations[broker]}
 
-    renamed = df.rename(columns=broker_translations)
+    renamed_columns = {}
+    for column in df.columns:
+        for site_market, market in broker_translations.items():
+            if column == site_market or column.startswith(site_market + ' '):
+                renamed_columns[column] = market + column[len(site_market):]
+                break
+
+    renamed = df.rename(columns=renamed_columns, copy=False)
     return renamed
 
 
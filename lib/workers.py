@@ -0,0 +1,241 @@
+import importlib
+import signal
+import time
+from multiprocessing import Process, Queue
+
+from selenium.common.exceptions import WebDriverException
+
+from . import feeds, health, recycling, tracing, transport, utils
+
+psutil_installed = True
+
+try:
+    import psutil
+except ImportError:
+    psutil_installed = False
+
+
+# Checks whether a webdriver session is still usable
+def session_alive(driver):
+    try:
+        driver.current_url
+        return True
+    except WebDriverException:
+        return False
+
+
+# Closes a webdriver, ignoring errors from sessions that have already died
+def close_session(driver):
+    try:
+        driver.quit()
+    except WebDriverException:
+        pass
+
+
+# Gets why a site's browser should be recycled, or None if it's fine or can't be checked, e.g. because it's died
+def check_browser(driver):
+    try:
+        return recycling.recycle_reason(driver)
+    except WebDriverException:
+        return None
+
+
+# Swaps a finished replacement in for a site's browser, closing the old one. The old one is kept if the replacement
+# couldn't be opened
+def swap_browser(site, driver, replacement):
+    new_driver = recycling.wait_for_replacement(replacement)
+    if new_driver is None:
+        print(f'- {site}: Couldn\'t open a replacement browser, keeping the old one. ({replacement["error"]})')
+        return driver
+
+    if driver is not None:
+        close_session(driver)
+    print(f'- {site}: Swapped in the replacement browser')
+    return new_driver
+
+
+# Closes a replacement browser that's no longer needed, once it's finished opening
+def discard_replacement(replacement):
+    new_driver = recycling.wait_for_replacement(replacement)
+    if new_driver is not None:
+        close_session(new_driver)
+
+
+# Long-lived worker for a single site. Keeps its browser session open between cycles and scrapes whenever it gets a
+# (cycle, sport, markets) command, only opening a new session when the old one has died or was closed to make room in
+# the browser pool. Each market's dataframe is put on the results queue as soon as it's scraped, followed by a message
+# saying the site is done. Every message is tagged with the cycle so results that arrive too late can be ignored. A
+# browser that's over the recycling limits after a job is replaced in the background, ready for a later job
+def run_worker(site, module_name, commands, results):
+    # Ctrl+C is used to skip the wait between cycles, so only the main process should handle it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    module = importlib.import_module(module_name)
+    driver = None
+    replacement = None
+
+    # Every span from this worker is for this site
+    tracing.configure()
+    tracing.set_context(broker=site)
+
+    # Dataframes are either pickled onto the results queue or put in shared memory, as set in the settings and where the
+    # system supports it
+    use_shared_memory = utils.get_setting('transport', 'mode') == 'shared_memory' and transport.SHARED_MEMORY_SUPPORTED
+
+    while True:
+        command = commands.get()
+
+        # None means the program is stopping
+        if command is None:
+            break
+
+        # The browser pool needs this worker's browser for another site
+        if command == 'close':
+            if driver is not None:
+                close_session(driver)
+                driver = None
+            if replacement is not None:
+                discard_replacement(replacement)
+                replacement = None
+            continue
+
+        cycle, sport, markets = command
+        utils.load_settings(reload=True)
+
+        # Use the replacement browser if it's ready, otherwise the old one does this job too
+        if replacement is not None and recycling.replacement_ready(replacement):
+            driver = swap_browser(site, driver, replacement)
+            replacement = None
+
+        # Send each market on as soon as it's scraped
+        def publish(market, market_odds):
+            with tracing.span('create_df', market=market, rows=len(market_odds['Competitors'])):
+                df = module.create_df({market: market_odds})
+
+            message = {'type': 'market', 'cycle': cycle, 'broker': site, 'market': market, 'time': time.time()}
+            if use_shared_memory:
+                with tracing.span('share_df', market=market):
+                    message['shared'] = transport.share_df(df)
+            else:
+                message['df'] = df
+            results.put(message)
+
+        error = None
+        try:
+            if driver is None or not session_alive(driver):
+                if driver is not None:
+                    print(f'- {site}: Session died, reopening')
+                    close_session(driver)
+                with tracing.span('open_session'):
+                    driver = health.retry(module.open_session, exceptions=(WebDriverException,))
+
+            # Sites can be read from their feeds rather than their pages, as set in the settings
+            with tracing.span('scrape', sport=sport, markets=len(markets)):
+                if utils.get_site_setting(site, 'acquisition') == 'feed':
+                    feeds.scrape(driver, site, module, sport, markets, publish)
+                else:
+                    module.scrape(driver, sport, markets, publish)
+        except Exception as e:
+            error = e.__class__.__name__
+            print(f'- {site}: Error while scraping, returning. ({error})')
+
+        # Always say we're done so main isn't left waiting, sending the job's spans and any error along with it
+        results.put({'type': 'done', 'cycle': cycle, 'broker': site, 'time': time.time(), 'error': error,
+                     'spans': tracing.take_spans()})
+
+        # Start opening a replacement while the worker waits for its next job if the browser has grown too big or old
+        if replacement is None and error is None and driver is not None:
+            reason = check_browser(driver)
+            if reason is not None:
+                print(f'- {site}: Recycling browser ({reason})')
+                replacement = recycling.start_replacement(module.open_session)
+
+    if driver is not None:
+        close_session(driver)
+    if replacement is not None:
+        discard_replacement(replacement)
+
+
+# Starts a worker process for a site
+def start_worker(site, module_name, results):
+    commands = Queue()
+    process = Process(target=run_worker, args=(site, module_name, commands, results), daemon=True)
+    process.start()
+    print(f'- {site}: Started worker')
+    return {'site': site, 'module': module_name, 'process': process, 'commands': commands, 'busy_since': None,
+            'browser_open': False}
+
+
+# Starts a worker process for every site, all returning their results to the same queue
+def start_workers(site_list, results):
+    workers = {}
+
+    for site in site_list:
+        workers[site] = start_worker(site, site_list[site].__name__, results)
+
+    return workers
+
+
+# Gets every process a worker has started, e.g. chromedriver and Chrome. These can only be found while the worker is
+# running, so they're found just before it's terminated. Empty if psutil isn't installed
+def child_processes(process):
+    if not psutil_installed:
+        return []
+
+    try:
+        return psutil.Process(process.pid).children(recursive=True)
+    except psutil.Error:
+        return []
+
+
+# Terminates a worker that didn't stop when told to, killing its chromedriver and Chrome too so they aren't left running
+# with the site's browser profile locked
+def terminate_worker(worker):
+    children = child_processes(worker['process'])
+    worker['process'].terminate()
+    worker['process'].join()
+
+    for child in children:
+        try:
+            child.kill()
+        except psutil.Error:
+            pass
+
+
+# Replaces a worker that has died or got stuck with a new one. A stuck worker is told to stop first, so it can close
+# its browser and isn't killed halfway through putting a result on the results queue, and is only terminated if it
+# hasn't stopped within the timeout
+def restart_worker(worker, results, timeout=5):
+    if worker['process'].is_alive():
+        worker['commands'].put(None)
+        worker['process'].join(timeout)
+
+    if worker['process'].is_alive():
+        terminate_worker(worker)
+
+    worker.update(start_worker(worker['site'], worker['module'], results))
+    return worker
+
+
+# Tells a site worker to scrape a sport's markets for a cycle, which opens its browser if it isn't already
+def send_command(worker, cycle, sport, markets):
+    worker['busy_since'] = time.time()
+    worker['browser_open'] = True
+    worker['commands'].put((cycle, sport, markets))
+
+
+# Tells an idle site worker to close its browser, making room in the browser pool
+def close_browser(worker):
+    worker['browser_open'] = False
+    worker['commands'].put('close')
+
+
+# Stops all site workers, giving them time to close their browsers before terminating any that are still running
+def stop_workers(workers, timeout=10):
+    for site in workers:
+        workers[site]['commands'].put(None)
+
+    for site in workers:
+        workers[site]['process'].join(timeout)
+        if workers[site]['process'].is_alive():
+            terminate_worker(workers[site])
@@ -0,0 +1,83 @@
+# Measures how long each site's page takes to load and how much memory Chrome uses with the browser profile in the
+# settings, against Chrome as it was started before the lean profile, so the effect of the profile can be checked for
+# every site. Results are saved as JSON, e.g. `python measure_browser.py --sites Betfair bwin --loads 3 --output
+# browser.json`. Memory is only measured if psutil is installed
+import argparse
+import json
+import time
+
+from lib import browser
+from vorn_surebet_finder import site_list
+
+# Reads the page's navigation timings and what it downloaded, in milliseconds and bytes
+TIMING_SCRIPT = '''
+const navigation = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+return {
+    dom_content_loaded: navigation ? navigation.domContentLoadedEventEnd : null,
+    load: navigation ? navigation.loadEventEnd : null,
+    resources: resources.length,
+    transferred: resources.reduce((total, resource) => total + (resource.transferSize || 0), 0)
+};
+'''
+
+
+# Averages a measurement over every load, skipping ones that couldn't be measured
+def average(loads, key):
+    values = [load[key] for load in loads if load[key] is not None]
+    return sum(values) / len(values) if values else None
+
+
+# Loads a site's page a number of times with a profile, measuring each load and Chrome's memory afterwards
+def measure_profile(site, profile, loads):
+    driver = browser.initialise_webdriver(site, profile)
+    results = []
+
+    try:
+        for _ in range(loads):
+            start = time.perf_counter()
+            driver.get(site_list[site].SITE_LINK)
+            timings = driver.execute_script(TIMING_SCRIPT)
+            timings['ready'] = (time.perf_counter() - start) * 1000
+            timings['rss'] = browser.get_rss(driver)
+            results.append(timings)
+    finally:
+        driver.quit()
+
+    return {key: average(results, key) for key in ['ready', 'dom_content_loaded', 'load', 'resources', 'transferred',
+                                                   'rss']}
+
+
+# Main function
+def main(sites, loads, output=None):
+    results = []
+
+    for site in sites:
+        profile = browser.get_profile(site)
+        before = measure_profile(site, {**profile, 'lean': False, 'user_data_directory': None}, loads)
+        after = measure_profile(site, profile, loads)
+        results.append({'site': site, 'profile': profile, 'before': before, 'after': after})
+
+        for name, measured in [('before', before), ('after', after)]:
+            rss = 'unknown' if measured['rss'] is None else f'{measured["rss"]:.0f}MB'
+            print(f'{site} ({name}): ready in {measured["ready"]:.0f}ms, {measured["resources"]:.0f} resources, '
+                  f'{measured["transferred"] / 1024:.0f}KB transferred, {rss} RSS')
+
+    # Save the measurements so they can be compared between profiles
+    if output is not None:
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure page loads and memory with and without the lean browser '
+                                                 'profile.')
+    parser.add_argument('--sites', nargs='+', default=list(site_list), choices=list(site_list),
+                        help='sites to measure')
+    parser.add_argument('--loads', type=int, default=3, help='times to load each site with each profile')
+    parser.add_argument('--output', help='file to save the measurements to as JSON')
+    args = parser.parse_args()
+
+    main(args.sites, args.loads, args.output)
@@ -0,0 +1,39 @@
+# Parses saved feed payloads with a site's feed settings, without the site, to check the settings read every market
+# properly. Turn on "save_payloads" in the "feeds" section of files/settings.json to save the payloads from every scrape
+# of a site read from its feed, then run e.g. `python parse_feed.py files/feeds/bwin-20210601-120000.json --site bwin`
+import argparse
+
+import pandas as pd
+
+from lib import feeds, odds
+
+
+# Main function
+def main(paths, site, markets=None):
+    feed = feeds.get_feed(site)
+    payloads = [payload for path in paths for payload in feeds.load_payloads(path)]
+
+    odds_dict = feeds.parse_payloads(payloads, feed, markets)
+    if not odds_dict:
+        print(f'No odds found in {len(payloads)} payload(s)')
+        return None
+
+    df = odds.create_df(odds_dict)
+    with pd.option_context('display.max_rows', 500, 'display.max_columns', 500, 'display.width', 1000):
+        for market in odds_dict:
+            columns = ['Competitors', odds.count_column(market)] + odds.market_columns(df, market)
+            print(f'{market}: {len(odds_dict[market]["Competitors"])} event(s)')
+            print(df.loc[df[odds.count_column(market)] > 0, columns], end='\n\n')
+
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parse saved feed payloads into odds.')
+    parser.add_argument('paths', nargs='+', help='saved payload files')
+    parser.add_argument('--site', required=True, help='site whose feed settings to parse the payloads with')
+    parser.add_argument('--markets', nargs='+',
+                        help='markets to parse, as the feed names them. Defaults to all of them')
+    args = parser.parse_args()
+
+    main(args.paths, args.site, args.markets)
@@ -0,0 +1,74 @@
+# Replays recorded cycles through surebet detection and calculations as fast as possible, without the live sites, so
+# detection can be profiled and regression-tested on real data. Turn recording on in files/settings.json to record
+# cycles while the program runs, then run e.g. `python replay.py files/recordings --output surebets.json`
+import argparse
+import json
+import time
+
+from lib import detection, events, calculations, recording, utils
+
+
+# Runs a recorded cycle through detection and calculations. Brokers are added to the event index in the order they
+# arrived, like in main, then every market is checked at once with all its brokers, on the detection pool if it's
+# running
+def replay_cycle(cycle, total_stake, rounding_base):
+    markets, three_way_markets = utils.get_markets(cycle['sport'])
+    event_index = events.create_index()
+    market_dfs = {}
+
+    for message in cycle['messages']:
+        market_dfs.setdefault(message['market'], {})[message['broker']] = message['df']
+        event_index = events.index_broker(event_index, message['broker'], message['df']['Competitors'].tolist())
+
+    all_surebets = detection.get_all_surebets(market_dfs, three_way_markets, event_index)
+    return calculations.do_surebet_calculations(all_surebets, three_way_markets, total_stake, rounding_base)
+
+
+# Counts the bets found in a cycle
+def count_bets(all_surebets):
+    return sum(len(all_surebets[market][broker_combo]) for market in all_surebets
+               for broker_combo in all_surebets[market])
+
+
+# Main function
+def main(paths, total_stake, rounding_base, output=None):
+    results = []
+    total_time = 0
+
+    for path in recording.find_recordings(paths):
+        for cycle in recording.load_recording(path):
+            start = time.perf_counter()
+            all_surebets = replay_cycle(cycle, total_stake, rounding_base)
+            elapsed = time.perf_counter() - start
+            total_time += elapsed
+
+            results.append({'file': path, 'cycle_time': cycle['time'], 'sport': cycle['sport'],
+                            'seconds': elapsed, 'surebets': all_surebets})
+            print(f'{path}: {len(cycle["messages"])} dataframe(s), {count_bets(all_surebets)} surebet(s) in '
+                  f'{elapsed * 1000:.1f}ms')
+
+    print(f'Replayed {len(results)} cycle(s) in {total_time:.3f}s')
+
+    # Save the surebets so they can be compared between versions
+    if output is not None:
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay recorded cycles through surebet detection.')
+    parser.add_argument('paths', nargs='+', help='recording files, or directories containing them')
+    parser.add_argument('--total-stake', type=int, default=100, help='total stake for each surebet')
+    parser.add_argument('--rounding-base', type=int, default=5, help='round each stake to the nearest multiple of this')
+    parser.add_argument('--output', help='file to save the surebets found to as JSON')
+    parser.add_argument('--processes', type=int, help='processes to detect surebets with, 0 for one for each CPU. '
+                                                      'Defaults to the detection settings')
+    args = parser.parse_args()
+
+    detection.start_pool(args.processes)
+    try:
+        main(args.paths, args.total_stake, args.rounding_base, args.output)
+    finally:
+        detection.stop_pool()
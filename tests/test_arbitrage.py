@@ -0,0 +1,48 @@
+import numpy as np
+
+from lib import arbitrage, detection, odds
+
+nan = np.nan
+
+
+def test_best_odds_must_come_from_more_than_one_broker():
+    # Events by brokers A, B and C by outcomes
+    tensor = np.array([[[2.1, 1.8], [1.9, 2.2], [nan, 2.3]],
+                       [[3.0, 3.0], [1.5, 1.5], [nan, nan]],
+                       [[2.0, nan], [nan, nan], [nan, nan]],
+                       [[1.9, 1.9], [1.95, 1.8], [nan, nan]]])
+
+    best_odds, best_brokers, implied, surebets = arbitrage.find_surebets(tensor)
+
+    np.testing.assert_array_equal(best_odds[0], [2.1, 2.3])
+    np.testing.assert_array_equal(best_brokers[0], [0, 2])
+    np.testing.assert_allclose(implied[[0, 1, 3]], [1 / 2.1 + 1 / 2.3, 1 / 3.0 + 1 / 3.0, 1 / 1.95 + 1 / 1.9])
+
+    # Event 1 is only under 1 with both bets at A, and event 2 is missing an outcome
+    assert surebets.tolist() == [True, False, False, False]
+    assert implied[2] == np.inf
+
+
+def test_surebets_are_grouped_by_the_brokers_of_each_outcome():
+    tensor = np.array([[[2.1, 1.8], [1.9, 2.2], [nan, 2.3]],
+                       [[2.5, 1.7], [1.6, 2.6], [nan, nan]],
+                       [[2.4, 1.5], [1.5, 2.0], [nan, 2.7]]])
+
+    surebet_dfs = arbitrage.get_surebet_dfs(['E0', 'E1', 'E2'], ['A', 'B', 'C'], *arbitrage.find_surebets(tensor))
+
+    assert sorted(surebet_dfs) == ['A-B', 'A-C']
+    assert surebet_dfs['A-C']['Competitors'].tolist() == ['E0', 'E2']
+    assert surebet_dfs['A-C'][['Odds 1', 'Odds 2']].to_numpy().tolist() == [[2.1, 2.3], [2.4, 2.7]]
+    assert surebet_dfs['A-B']['Competitors'].tolist() == ['E1']
+
+
+def test_odds_from_a_broker_with_the_teams_reversed_are_flipped():
+    market_dfs = {'win': {'A': odds.market_df('win', ['Arsenal - Chelsea'], [['2.0', '3.5', '4.5']]),
+                          'B': odds.market_df('win', ['Chelsea - Arsenal'], [['1.5', '3.0', '5.0']])}}
+
+    all_surebets = detection.get_all_surebets(market_dfs, ['win'])
+
+    # B's 5.0 is on Arsenal, the home team, and its 1.5 on Chelsea doesn't beat A's 4.5
+    surebet_df = all_surebets['win']['B-A-A']
+    assert surebet_df['Competitors'].tolist() == ['Arsenal - Chelsea']
+    assert surebet_df[['Odds 1', 'Odds 2', 'Odds 3']].to_numpy().tolist() == [[5.0, 3.5, 4.5]]
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib import calculations
+
+
+def test_stakes_are_split_so_every_outcome_returns_the_same():
+    stakes = calculations.unrounded_stakes([[2.2, 2.1], [2.5, 2.5], [4.0, 2.0]], 100)
+
+    np.testing.assert_array_equal(stakes, [[48.84, 51.16], [50, 50], [33.33, 66.67]])
+
+
+def test_a_single_bet_is_a_batch_of_one():
+    np.testing.assert_array_equal(calculations.unrounded_stakes([3.0, 3.0, 3.0], 90), [[30, 30, 30]])
+
+
+def test_rounded_stakes_keep_their_profits():
+    stakes, profits, benefits = calculations.rounded_calculations([[2.2, 2.1]], [[48.84, 51.16]], 100, 5)
+
+    np.testing.assert_array_equal(stakes, [[50, 50]])
+    np.testing.assert_allclose(profits, [[10, 5]])
+    np.testing.assert_allclose(benefits, [[10, 5]])
+
+
+def test_last_stake_is_cut_when_rounding_goes_over_the_total():
+    stakes, profits, benefits = calculations.rounded_calculations([[2.5, 2.5, 2.5], [4.0, 4.0, 2.0]],
+                                                                  [[33.33, 33.33, 33.33], [25, 25, 50]], 100, 5)
+
+    # Only the bet that went over is changed
+    np.testing.assert_array_equal(stakes, [[35, 35, 30], [25, 25, 50]])
+    np.testing.assert_allclose(profits[0], [-12.5, -12.5, -25])
+
+
+def test_unsafe_bets_are_discarded():
+    surebets_df = pd.DataFrame({'Competitors': ['Arsenal - Chelsea', 'Leeds - Spurs'], 'Odds 1': [2.3, 2.2],
+                                'Odds 2': [2.4, 2.1]})
+
+    bet_dicts = calculations.do_surebet_calculations({'btts': {'Betfair-bwin': surebets_df}}, [], 100, 5)
+
+    # A 5% profit on Leeds - Spurs is under MIN_PROFIT_PERCENT
+    bets = bet_dicts['btts']['Betfair-bwin']
+    assert list(bets) == ['Arsenal - Chelsea']
+    assert bets['Arsenal - Chelsea'] == {'Odds 1': 2.3, 'Odds 2': 2.4, 'Stake 1': 50.0, 'Stake 2': 50.0,
+                                         'Profit 1': pytest.approx(15), 'Profit 2': pytest.approx(20),
+                                         'Benefit 1': '15.00%', 'Benefit 2': '20.00%'}
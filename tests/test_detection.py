@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from lib import detection, events, odds
+
+MARKETS = ['win', 'btts']
+
+
+# Stops the detection pool after each test, so it isn't left running for the next one
+@pytest.fixture
+def detection_pool():
+    yield detection.start_pool(2)
+    detection.stop_pool()
+
+
+# Each broker's dataframe with both markets
+def broker_dfs():
+    competitors = {'A': ['Arsenal - Chelsea', 'Leeds - Spurs'], 'B': ['Chelsea - Arsenal', 'Leeds - Spurs']}
+    win = {'A': [['2.0', '3.5', '4.5'], ['2.2', '3.3', '3.1']], 'B': [['1.5', '3.0', '5.0'], ['3.6', '3.4', '2.0']]}
+    btts = {'A': [['2.1', '1.7'], ['1.9', '1.9']], 'B': [['1.7', '2.2'], ['2.0', '1.8']]}
+    return {broker: odds.combine_dfs([odds.market_df('win', competitors[broker], win[broker]),
+                                      odds.market_df('btts', competitors[broker], btts[broker])])
+            for broker in competitors}
+
+
+def test_the_pool_finds_the_same_surebets(detection_pool):
+    assert detection_pool is not None
+    pooled = detection.get_all_surebets({'win': broker_dfs()}, ['win'], markets=MARKETS)
+
+    detection.stop_pool()
+    expected = detection.get_all_surebets({'win': broker_dfs()}, ['win'], markets=MARKETS)
+
+    assert sorted(pooled) == sorted(expected) == sorted(MARKETS)
+    for market in MARKETS:
+        assert sorted(pooled[market]) == sorted(expected[market])
+        for broker_combo in expected[market]:
+            pd.testing.assert_frame_equal(pooled[market][broker_combo], expected[market][broker_combo])
+
+
+def test_market_jobs_finish_in_the_background(detection_pool):
+    dfs = broker_dfs()
+    index = events.build_index(dfs)
+
+    job = detection.start_market(dfs, 'btts', ['win'], index)
+    surebets = detection.wait_for_market(job)
+
+    assert detection.market_ready(job)
+    assert surebets['A-B']['Competitors'].tolist() == ['Arsenal - Chelsea']
+    assert surebets['A-B'][['Odds 1', 'Odds 2']].to_numpy().tolist() == [[2.1, 2.2]]
@@ -0,0 +1,47 @@
+import pytest
+
+from lib import events
+
+
+# Gets the event IDs two brokers' competitor names are given in the same index
+def index_pair(first, second, matcher=None):
+    index = events.create_index()
+    index = events.index_broker(index, 'A', [first], matcher=matcher)
+    index = events.index_broker(index, 'B', [second], matcher=matcher)
+    return index['rows']['A'][first][0], index['rows']['B'][second][0]
+
+
+@pytest.mark.parametrize('second', ['Arsenal U21 - Chelsea U21', 'Arsenal Under-23 - Chelsea Under 23',
+                                    'Arsenal II - Chelsea II', 'Arsenal B - Chelsea B', 'Arsenal Women - Chelsea Women',
+                                    'Arsenal Reserves - Chelsea Reserves'])
+@pytest.mark.parametrize('matcher', ['fuzzywuzzy', 'rapidfuzz'])
+def test_youth_reserve_and_women_teams_never_match_first_teams(second, matcher):
+    # Without rapidfuzz, asking for it would quietly test fuzzywuzzy twice
+    if matcher == 'rapidfuzz':
+        pytest.importorskip('rapidfuzz')
+
+    first_id, second_id = index_pair('Arsenal - Chelsea', second, matcher)
+    assert first_id != second_id
+
+
+@pytest.mark.parametrize('first, second', [('Arsenal U21 - Chelsea U21', 'Arsenal FC U-21 - Chelsea Under 21'),
+                                           ('Arsenal Women - Chelsea Women', 'Arsenal W - Chelsea FC W'),
+                                           ('Man Utd - Liverpool', 'Manchester United v Liverpool FC')])
+def test_teams_with_the_same_markers_still_match(first, second):
+    first_id, second_id = index_pair(first, second)
+    assert first_id == second_id
+
+
+def test_aliases_are_loaded_once_and_only_new_ones_saved(tmp_path, monkeypatch):
+    store = events.aliases.open_store(str(tmp_path / 'aliases.sqlite3'))
+    loads, saves = [], []
+    monkeypatch.setattr(events.aliases, 'load_aliases', lambda *args: loads.append(args) or {})
+    monkeypatch.setattr(events.aliases, 'save_aliases', lambda store, broker, new: saves.append(sorted(new)))
+
+    index = events.create_index()
+    index = events.index_broker(index, 'A', ['Arsenal - Chelsea'], store)
+    index = events.index_broker(index, 'A', ['Arsenal - Chelsea', 'Leeds - Spurs'], store)
+    index = events.index_broker(index, 'A', ['Leeds - Spurs'], store)
+
+    assert len(loads) == 1
+    assert saves == [['Arsenal - Chelsea'], ['Leeds - Spurs']]
@@ -0,0 +1,60 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import parse_feed
+from lib import feeds
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE = os.path.join(ROOT, 'tests', 'fixtures', 'bwin-feed.json')
+MARKETS = ['Result 1X2', 'Both teams to score?']
+
+
+# Settings are read from files/settings.json relative to where the program is run
+@pytest.fixture(autouse=True)
+def run_from_root(monkeypatch):
+    monkeypatch.chdir(ROOT)
+
+
+# Fake driver whose network log has one feed response and one response from somewhere else
+class FeedDriver:
+    def __init__(self, bodies):
+        self.bodies = bodies
+
+    def get_log(self, log_type):
+        messages = []
+        for request_id, url in [('1', 'https://sports.bwin.com/cds-api/bettingoffer/fixtures?x-bwin-accessid=1'),
+                                ('2', 'https://sports.bwin.com/en/sports/api/widget')]:
+            messages += [{'method': 'Network.responseReceived',
+                          'params': {'requestId': request_id, 'response': {'url': url}}},
+                         {'method': 'Network.loadingFinished', 'params': {'requestId': request_id}}]
+        return [{'message': json.dumps({'message': message})} for message in messages]
+
+    def execute_cdp_cmd(self, command, params):
+        return {'body': json.dumps(self.bodies[params['requestId']]), 'base64Encoded': False}
+
+
+def test_parse_feed_turns_the_bwin_fixture_into_odds():
+    df = parse_feed.main([FIXTURE], 'bwin', MARKETS)
+
+    result = df[df['Result 1X2 Outcomes'] > 0]
+    assert result['Competitors'].tolist() == ['Arsenal - Chelsea']
+    assert result[['Result 1X2 1', 'Result 1X2 2', 'Result 1X2 3']].to_numpy().tolist() == [[2.1, 3.4, 3.6]]
+
+    # The second payload updates Arsenal - Chelsea's odds
+    btts = df[df['Both teams to score? Outcomes'] > 0].set_index('Competitors')
+    expected = pd.DataFrame({'Both teams to score? 1': [1.75, 1.6], 'Both teams to score? 2': [2.0, 2.25]},
+                            index=pd.Index(['Arsenal - Chelsea', 'Leeds United - Tottenham'], name='Competitors'))
+    pd.testing.assert_frame_equal(btts[expected.columns].sort_index(), expected)
+
+    # Markets that weren't asked for are left out
+    assert not any(column.startswith('Next goal') for column in df.columns)
+
+
+def test_bwin_feed_settings_capture_only_the_feed():
+    payloads = feeds.load_payloads(FIXTURE)
+    driver = FeedDriver({'1': payloads[0], '2': {'fixtures': [{'name': {'value': 'Not - Odds'}}]}})
+
+    assert feeds.read_payloads(driver, feeds.get_feed('bwin')) == [payloads[0]]
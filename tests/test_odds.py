@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from lib import odds
+
+
+@pytest.mark.parametrize('value, expected', [('5/4', 2.25), ('1/2', 1.5), ('2,5', 2.5), ('1.83', 1.83), (' 3.1 ', 3.1),
+                                             ('EVS', 2.0), ('evens', 2.0), (2.4, 2.4)])
+def test_odds_are_parsed_into_decimal_odds(value, expected):
+    assert odds.parse_odds([value])[0] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('value', ['SUSP', '', None, '3/0', '1', '0.5', '-'])
+def test_odds_that_cant_be_bet_on_are_nan(value):
+    assert np.isnan(odds.parse_odds([value])[0])
+
+
+def test_market_rows_are_padded_and_counted():
+    df = odds.market_df('win', ['Arsenal - Chelsea', 'Leeds - Spurs'], ['2.1\n3.4\n3.6', ['EVS', 'SUSP']])
+
+    assert df['win Outcomes'].tolist() == [3, 2]
+    np.testing.assert_array_equal(df[odds.outcome_columns('win', 3)].to_numpy(),
+                                  [[2.1, 3.4, 3.6], [2.0, np.nan, np.nan]])
+
+
+def test_market_odds_only_keep_rows_with_the_right_outcomes():
+    df = odds.market_df('over-under', ['A - B', 'C - D', 'E - F'], [['2.5', '1.9', '1.95'], ['1.8', '2.0'], ['3.0']])
+
+    np.testing.assert_array_equal(odds.market_odds(df, 'over-under', 2),
+                                  [[np.nan, np.nan], [1.8, 2.0], [np.nan, np.nan]])
+
+    # The goal line some brokers show first is skipped with keep_last
+    np.testing.assert_array_equal(odds.market_odds(df, 'over-under', 2, keep_last=True),
+                                  [[1.9, 1.95], [1.8, 2.0], [np.nan, np.nan]])
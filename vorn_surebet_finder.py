@@ -14,88 +14,131 @@
 # ------------------------------------
 import time
 
-from multiprocessing import Process, Queue
+from multiprocessing import Queue
 
-from lib import two_way, three_way, utils, calculations, ui
+from lib import detection, aliases, events, utils, calculations, ui, workers, orchestrator, recording, tracing, \
+    transport, scheduler
 from lib.sites import betfair, bwin, ladbrokes
 
 # Sites
 site_list = {
-    'Betfair': betfair.get_data,
-    'bwin': bwin.get_data,
-    'Ladbrokes': ladbrokes.get_data
+    'Betfair': betfair,
+    'bwin': bwin,
+    'Ladbrokes': ladbrokes
 }
 
 
+# Alerts the user to any surebets in a market that haven't been alerted yet this cycle
+def alert_new_surebets(market_surebets, market, sport, three_way_markets, total_stake, rounding_base, alerted):
+    bets = calculations.do_surebet_calculations({market: market_surebets}, three_way_markets, total_stake,
+                                                rounding_base)
+
+    # Only keep bets we haven't seen yet
+    new_bets = {market: {}}
+    for broker_combo in bets[market]:
+        for competitors in bets[market][broker_combo]:
+            if (market, broker_combo, competitors) in alerted:
+                continue
+            alerted.add((market, broker_combo, competitors))
+            new_bets[market].setdefault(broker_combo, {})[competitors] = bets[market][broker_combo][competitors]
+
+    ui.alert_surebets(new_bets, sport)
+    return alerted
+
+
 # Main function
-def main(sport, markets, three_way_markets, total_stake, rounding_base):
-    # Create dictionary of sites with translated markets
-    sites = {}
-
-    for site in site_list:
-        sites[site] = {
-            'fn': site_list[site],
-            'args': [
-                sport,
-                [utils.translate_to_site_market(market, site) for market in markets]
-            ]
-        }
-
-    # Create queue for multiprocessing
-    q = Queue()
-
-    # List of jobs
-    jobs = []
-
-    # Create jobs, start them and join the queue
-    for site in sites:
-        args = [q] + sites[site]['args']
-        p = Process(target=sites[site]['fn'], args=args)
-        print(f'- {site}: Creating job')
-        jobs.append(p)
-        p.start()
-
-    # Will store output of queue processes
-    df_dicts = []
-
-    # Get results from functions
-    for j in jobs:
-        df_dicts.append(q.get())
-
-    # Combine dictionary results into single dictionary
-    results = {}
-    for df_dict in df_dicts:
-        results.update(df_dict)
-
-    # Translate columns back
-    for broker in results:
-        results[broker] = utils.translate_columns(results[broker], broker)
-        # print(f'\n\n\n{broker}')
-        # print(results[broker])
-
-    # Dictionary to store all surebets
+def main(sport, markets, three_way_markets, total_stake, rounding_base, site_workers, results_queue):
+    # Each market's dataframes from each broker, stored as they arrive
+    market_dfs = {}
+
+    # Events are matched between brokers as they arrive, reusing aliases from previous cycles
+    alias_store = aliases.open_store()
+    event_index = events.create_index()
+
+    # Dictionary to store all surebets, and set of surebets the user has already been alerted to
     all_surebets = {}
+    alerted = set()
+
+    # Markets being checked for surebets, in the order they were started. See detection.start_market
+    detection_jobs = []
 
-    # Boolean to store if we have any surebets
-    surebets_found = False
+    # Record the cycle's dataframes for replaying later, if turned on in the settings
+    cycle_recording = recording.create_recording(sport) if utils.get_setting('recording', 'enabled') else None
 
-    for market in markets:
-        # Check if this is a three way market
-        if market in three_way_markets:
-            market_surebets, success = three_way.get_surebets(results, market)
-        else:
-            market_surebets, success = two_way.get_surebets(results, market)
+    # Stores the surebets from finished detection jobs and alerts the user to them straight away. Jobs are taken in the
+    # order they were started, so a market's latest surebets are the ones kept. Waits for every job if wait is set
+    def take_detections(wait=False):
+        nonlocal alerted
 
-        # If a surebet was found, update boolean
-        if success:
-            surebets_found = True
+        while detection_jobs and (wait or detection.market_ready(detection_jobs[0])):
+            job = detection_jobs.pop(0)
+            market = job['market']
+            market_surebets = detection.wait_for_market(job)
+
+            if not market_surebets:
+                print(f'No surebets found for {market.title()}!')
+                continue
 
-            # Store the surebets
             all_surebets[market] = market_surebets
+            with tracing.span('alert', market=market):
+                alerted = alert_new_surebets(market_surebets, market, sport, three_way_markets, total_stake,
+                                             rounding_base, alerted)
+
+    # Handles each market's results as soon as they're scraped
+    def handle_market(message):
+        nonlocal event_index
+        broker = message['broker']
+
+        # Translate columns back and add the broker's events to the index
+        market = utils.translate_to_standard_market(message['market'], broker)
+        df = utils.translate_columns(transport.receive_df(message), broker)
+        market_dfs.setdefault(market, {})[broker] = df
+
+        if cycle_recording is not None:
+            recording.record_market(cycle_recording, broker, market, message['time'], df)
+
+        with tracing.span('match', broker=broker, market=market, rows=len(df)):
+            event_index = events.index_broker(event_index, broker, df['Competitors'].tolist(), alias_store)
+
+        # Look for surebets as soon as at least two brokers have the market, carrying on with the next results while
+        # the detection pool does
+        if len(market_dfs[market]) < 2:
+            return
+
+        with tracing.span('detect', market=market, brokers=len(market_dfs[market])):
+            detection_jobs.append(detection.start_market(market_dfs[market], market, three_way_markets, event_index))
+
+        take_detections()
+
+    # Send jobs to the site workers and handle their results until they're all done or out of time, then finish
+    # checking the markets still being checked
+    with tracing.span('cycle', sport=sport) as attributes:
+        attributes['dropped'] = orchestrator.run_cycle(site_workers, results_queue, sport, markets, handle_market,
+                                                       take_detections)
+        take_detections(wait=True)
+
+    # Sites that were in more surebets get scraped sooner next time
+    scheduler.record_yield(site_workers, all_surebets)
+
+    alias_store.close()
+
+    if cycle_recording is not None:
+        recording.save_recording(cycle_recording, utils.get_setting('recording', 'directory'))
+
+    # Surebets are copied out of the scraped dataframes, so any shared memory they're mapped from can be freed
+    market_dfs.clear()
+    transport.release_all()
 
     # Apply calculations to surebets found, if any, then present to user
-    if surebets_found:
-        all_surebets = calculations.do_surebet_calculations(all_surebets, three_way_markets, total_stake, rounding_base)
+    if all_surebets:
+        with tracing.span('calculations', markets=len(all_surebets)):
+            all_surebets = calculations.do_surebet_calculations(all_surebets, three_way_markets, total_stake,
+                                                                rounding_base)
+
+    # Save the cycle's trace before waiting on the user
+    tracing.save_trace()
+
+    if all_surebets:
         ui.present_surebets(all_surebets, sport)
 
 
@@ -114,6 +157,17 @@ if __name__ == '__main__':
     except (RuntimeError, KeyboardInterrupt, EOFError):
         utils.quit_program()
 
+    # Turn on tracing if it's set in the settings
+    tracing.configure()
+
+    # Start the detection pool, which is used for every cycle. It's started first so it isn't forked with the site
+    # workers' queues
+    detection.start_pool()
+
+    # Start the site workers, which keep their browsers open between cycles
+    results_queue = Queue()
+    site_workers = workers.start_workers(site_list, results_queue)
+
     # Run on a loop until user stops the program
     while True:
         # Separate timer variable
@@ -122,8 +176,11 @@ if __name__ == '__main__':
         try:
             # Run surebet program
             utils.clear()
-            main(sport, markets, three_way_markets, total_stake, rounding_base)
+            main(sport, markets, three_way_markets, total_stake, rounding_base, site_workers, results_queue)
         except (KeyboardInterrupt, InterruptedError):
+            workers.stop_workers(site_workers)
+            orchestrator.drain_results(site_workers, results_queue)
+            detection.stop_pool()
             utils.quit_program()
 
         try: